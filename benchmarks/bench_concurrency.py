@@ -0,0 +1,71 @@
+"""실행 중인 서버에 동시 요청을 보내 동시성 수준별 처리량과 지연 시간을 측정합니다.
+
+사용 예:
+    python benchmarks/bench_concurrency.py --url http://127.0.0.1:8000 --path /crawl --isbn 9788936434120
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def _worker(client, method, path, payload, params, count, latencies, errors):
+    for _ in range(count):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=payload, params=params)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_level(base_url, method, path, payload, params, concurrency, requests_per_worker):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            _worker(client, method, path, payload, params, requests_per_worker, latencies, errors)
+            for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": p95 * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/crawl", help="/crawl 또는 /get-book (ISBN 하나만 보내는 엔드포인트)")
+    parser.add_argument("--isbn", default="9788936434120")
+    parser.add_argument("--levels", default="1,4,16,64", help="쉼표로 구분한 동시성 수준")
+    parser.add_argument("--requests-per-worker", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.path == "/get-book":
+        method, payload, params = "GET", None, {"isbn": args.isbn}
+    else:
+        method, payload, params = "POST", {"isbn": args.isbn}, None
+
+    print(f"{'concurrency':>11} {'requests':>8} {'errors':>6} {'rps':>8} {'p50(ms)':>9} {'p95(ms)':>9}")
+    for level in (int(value) for value in args.levels.split(",")):
+        result = asyncio.run(run_level(args.url, method, args.path, payload, params, level, args.requests_per_worker))
+        print(f"{result['concurrency']:>11} {result['requests']:>8} {result['errors']:>6} "
+              f"{result['throughput_rps']:>8.2f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""저장해 둔 교보문고 검색 결과 HTML로 해시태그 추출 속도를 비교합니다.
+
+기존 방식(BeautifulSoup html.parser로 페이지 전체 파싱)과 crawling.py의 방식
+(해시태그 구간만 찾아 lexbor로 파싱)을 같은 페이지에 돌려 결과가 같은지 확인하고,
+페이지당 CPU 시간과 조기 종료 시 실제로 읽는 바이트 수를 보여줍니다.
+
+사용 예:
+    python benchmarks/bench_kyobo_parse.py --save 9788936434120 9788954682152
+    python benchmarks/bench_kyobo_parse.py --runs 50
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import crawling  # noqa: E402
+from category_registry import standard_categories  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "kyobo")
+
+
+def _save_fixtures(isbns):
+    """실제 검색 결과 페이지를 전부 받아서 fixtures 디렉터리에 저장합니다."""
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for isbn in isbns:
+        response = crawling.get_session().get(crawling.SEARCH_URL.format(isbn=isbn), timeout=crawling.kyobo.timeout)
+        response.raise_for_status()
+        path = os.path.join(FIXTURES_DIR, f"{isbn}.html")
+        with open(path, "wb") as f:
+            f.write(response.content)
+        print(f"saved {path} ({len(response.content) / 1024:.0f}KB)")
+
+
+def _synthetic_page(results=40, tags=8):
+    """저장된 페이지가 없을 때 쓰는, 검색 결과 페이지와 비슷한 크기/구조의 HTML입니다."""
+    items = []
+    for i in range(results):
+        tag_links = "".join(f'<a class="tag" href="/tag/{i}-{j}">#태그{i}-{j}</a>' for j in range(tags)) if i == 0 else ""
+        items.append(
+            f'<li class="prod_item"><div class="prod_info"><a class="prod_link" href="/detail/{i}">'
+            f'<span class="prod_name">도서 제목 {i}</span></a><span class="author">저자 {i}</span>'
+            f'<p class="prod_introduction">{"소개 문장입니다. " * 40}</p>'
+            f'<div class="tag_wrap">{tag_links}</div></div></li>'
+        )
+    script = "<script>" + "var x = 1;" * 5000 + "</script>"
+    return f"<html><head>{script}</head><body><ul class='prod_list'>{''.join(items)}</ul>{script}</body></html>".encode()
+
+
+def _load_fixtures():
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, "rb") as f:
+            pages[os.path.basename(path)] = f.read()
+    if not pages:
+        print(f"no fixtures in {FIXTURES_DIR}; using a synthetic page (run with --save ISBN ... to record real pages)\n")
+        pages["synthetic.html"] = _synthetic_page()
+    return pages
+
+
+def _bs4_hashtags(html):
+    """기존 구현: 페이지 전체를 html.parser로 파싱합니다."""
+    soup = BeautifulSoup(html, "html.parser")
+    hashtags = list(set(tag.text.replace("#", "") for tag in soup.select("a.tag")))
+    return [tag for tag in hashtags if tag not in standard_categories]
+
+
+def _bytes_read(html, chunk_size):
+    """조각 단위로 받을 때 해시태그 구간을 다 읽고 멈추기까지 받은 바이트 수입니다."""
+    reader = crawling._TagBlockReader()
+    for offset in range(0, len(html), chunk_size):
+        if reader.feed(html[offset:offset + chunk_size]):
+            return offset + chunk_size
+    return len(html)
+
+
+def _cpu_time(func, html, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.process_time()
+        func(html)
+        samples.append(time.process_time() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save", nargs="+", metavar="ISBN", help="검색 결과 페이지를 받아 fixture로 저장")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.save:
+        _save_fixtures(args.save)
+        return
+
+    pages = _load_fixtures()
+    print(f"{'page':<24}{'size':>8}{'read':>8}{'bs4':>10}{'lexbor':>10}{'speedup':>9}  same")
+    for name, html in pages.items():
+        old = _cpu_time(_bs4_hashtags, html, args.runs)
+        new = _cpu_time(crawling._extract_hashtags, html, args.runs)
+        same = set(_bs4_hashtags(html)) == set(crawling._extract_hashtags(html))
+        read = _bytes_read(html, crawling.KYOBO_CHUNK_SIZE)
+        print(f"{name:<24}{len(html) / 1024:>7.0f}K{read / 1024:>7.0f}K"
+              f"{old * 1000:>8.2f}ms{new * 1000:>8.2f}ms{old / max(new, 1e-9):>8.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""새 프로세스에서 앱 모듈을 import하는 데 걸리는 시간과 최대 메모리(RSS)를 측정합니다.
+
+무거운 클라이언트(chromadb, langchain_openai, openai)는 처음 사용할 때 만들어지므로,
+`--with-chroma`를 주면 공유 ChromaManager를 처음 여는 시간도 따로 측정합니다.
+
+사용 예:
+    python benchmarks/bench_startup.py --module main --runs 5 --top 15
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import resource, sys, time
+started = time.perf_counter()
+__import__({module!r})
+imported = time.perf_counter() - started
+opened = 0.0
+if {with_chroma!r}:
+    from clients import get_chroma_manager
+    started = time.perf_counter()
+    get_chroma_manager()
+    opened = time.perf_counter() - started
+print(imported, opened, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def _run_probe(module, with_chroma):
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, with_chroma=with_chroma)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    imported, opened, max_rss = output.split()
+    return float(imported), float(opened), int(max_rss)
+
+
+def _slowest_imports(module, top):
+    """`-X importtime` 결과에서 누적 시간이 가장 긴 최상위 import를 반환합니다."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if match and len(match.group(2)) <= 2:
+            rows.append((int(match.group(1)), match.group(3)))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="누적 import 시간이 긴 모듈을 몇 개 보여줄지")
+    parser.add_argument("--with-chroma", action="store_true", help="ChromaManager를 처음 여는 시간도 측정")
+    args = parser.parse_args()
+
+    samples = [_run_probe(args.module, args.with_chroma) for _ in range(args.runs)]
+    imported = [sample[0] for sample in samples]
+    print(f"import {args.module}: median={statistics.median(imported) * 1000:.0f}ms "
+          f"min={min(imported) * 1000:.0f}ms max={max(imported) * 1000:.0f}ms")
+    if args.with_chroma:
+        opened = [sample[1] for sample in samples]
+        print(f"first get_chroma_manager(): median={statistics.median(opened) * 1000:.0f}ms")
+    # Linux에서 ru_maxrss 단위는 KB입니다.
+    print(f"max RSS: median={statistics.median(sample[2] for sample in samples) / 1024:.1f}MB")
+
+    print("\nslowest top-level imports (cumulative):")
+    for cumulative, name in _slowest_imports(args.module, args.top):
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Chroma query 경로와 프로세스 내 NumPy 인덱스(vector_index.py)의 top-k 검색 속도를 비교합니다.
+
+컬렉션에 저장된 임베딩을 질의 벡터로 사용하므로 OpenAI API를 호출하지 않습니다.
+
+사용 예:
+    python benchmarks/bench_vector_index.py --queries 200 --k 20 --batch 1,32
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_index import VectorIndex
+
+
+def _timed(func, queries, batch):
+    latencies, results = [], []
+    for offset in range(0, len(queries), batch):
+        started = time.perf_counter()
+        results.extend(func(queries[offset:offset + batch]))
+        latencies.append(time.perf_counter() - started)
+    return latencies, results
+
+
+def _report(name, batch, latencies, count):
+    total = sum(latencies)
+    print(
+        f"{name:<7} batch={batch:<4} queries/s={count / total:10.1f} "
+        f"p50={statistics.median(latencies) * 1000:8.2f}ms max={max(latencies) * 1000:8.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--collection", default="books")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--batch", default="1,32", help="쉼표로 구분한 질의 배치 크기")
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=args.persist_directory).get_collection(args.collection)
+
+    with tempfile.TemporaryDirectory() as path:
+        started = time.perf_counter()
+        VectorIndex(path).build(collection)
+        print(f"build: {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        index = VectorIndex(path)
+        index.load()
+        print(f"load (memmap): {(time.perf_counter() - started) * 1000:.2f}ms, {len(index)} books")
+
+        rng = np.random.default_rng(0)
+        isbns = list(index.rows)
+        picked = rng.choice(len(isbns), size=min(args.queries, len(isbns)), replace=False)
+        queries = [np.asarray(index.get(isbns[row])[2]).tolist() for row in picked]
+
+        def chroma_search(batch):
+            return collection.query(query_embeddings=batch, n_results=args.k, include=["metadatas"])["ids"]
+
+        def index_search(batch):
+            return [[isbn for isbn, *_ in hits] for hits in index.search(batch, args.k)]
+
+        for batch in (int(size) for size in args.batch.split(",")):
+            chroma_latencies, chroma_ids = _timed(chroma_search, queries, batch)
+            index_latencies, index_ids = _timed(index_search, queries, batch)
+            _report("chroma", batch, chroma_latencies, len(queries))
+            _report("index", batch, index_latencies, len(queries))
+
+        # 인덱스는 정확한 검색이므로 HNSW(Chroma) 결과가 얼마나 일치하는지도 함께 봅니다.
+        overlap = [len(set(a) & set(b)) / len(b) for a, b in zip(chroma_ids, index_ids) if b]
+        print(f"chroma recall@{args.k} vs exact: {statistics.mean(overlap):.3f}")
+
+
+if __name__ == "__main__":
+    main()
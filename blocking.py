@@ -0,0 +1,19 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# pymysql, Chroma처럼 동기 I/O만 제공하는 작업을 이벤트 루프 밖에서 실행하기 위한 스레드 풀
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", 8))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """동기 함수를 제한된 스레드 풀에서 실행하고 결과를 기다립니다."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -1,7 +1,11 @@
+import asyncio
 from dotenv import load_dotenv
-import requests
 import os
 
+from http_client import get_async_client, get_session
+from outbound import get_upstream
+from response_cache import ResponseCache
+
 # .env 파일 로드
 load_dotenv()
 
@@ -32,13 +36,38 @@ class BestBook:
         return Book(self.isbn, self.title, self.author, self.publisher, self.publish_year, self.cover_url, self.description)
 
 
-# 알라딘 API로부터 책 정보를 조회하는 함수
-def get_book_info_by_isbn(isbn):
-    # 알라딘 상품 조회 API URL
-    url = 'http://www.aladin.co.kr/ttb/api/ItemLookUp.aspx'
+ITEM_LOOKUP_URL = 'http://www.aladin.co.kr/ttb/api/ItemLookUp.aspx'
+
+# 알라딘 API 호출 정책 (속도 제한, 제한 시간, 재시도, 서킷 브레이커)
+aladin = get_upstream("aladin")
+
+
+class AladinAPIError(Exception):
+    """알라딘 API가 HTTP 200으로 돌려준 오류 응답 (잘못된 TTBKey, 호출 한도 초과 등)."""
+
+
+def _check_error(data):
+    # 오류 응답에는 item이 없으므로, 그대로 두면 "찾을 수 없음"으로 캐시됩니다.
+    if 'errorCode' in data:
+        raise AladinAPIError(f"{data['errorCode']}: {data.get('errorMessage')}")
+    return data
+
+
+def _get_json(url, params):
+    response = get_session().get(url, params=params, timeout=aladin.timeout)
+    response.raise_for_status()  # HTTP 오류가 있으면 예외 발생
+    return _check_error(response.json())
+
+
+async def _aget_json(url, params):
+    response = await get_async_client().get(url, params=params, timeout=aladin.timeout)
+    response.raise_for_status()
+    return _check_error(response.json())
+
 
+def _item_lookup_params(isbn):
     # API 요청 파라미터 설정
-    params = {
+    return {
         'ttbkey': os.getenv("ALADIN_TTBKEY"),
         'itemIdType': 'ISBN',
         'ItemId': isbn,
@@ -46,77 +75,146 @@ def get_book_info_by_isbn(isbn):
         'Version': '20131101'
     }
 
-    # API 요청 보내기
-    response = requests.get(url, params=params)
-
-    # 요청 성공 시 JSON 데이터 처리
-    if response.status_code == 200:
-        data = response.json()
-
-        # 첫 번째 결과 추출
-        if 'item' in data:
-            item = data['item'][0]
-
-            # 필요한 정보 추출
-            isbn = item['isbn13']
-            publish_year = item['pubDate'][:4]  # 연도만 추출
-            author = item['author']
-            cover_url = item['cover'].replace("coversum", "cover500")  # cover500으로 치환
-            description = item['description']
-            publisher = item['publisher']
-            title = item['title']
-
-            # Book 객체 생성 및 반환
-            return Book(isbn, title, author, publisher, publish_year, cover_url, description)
-        else:
-            print("책 정보를 찾을 수 없습니다.")
-    else:
-        print(f"요청 실패: {response.status_code}")
+
+def _parse_item_lookup(data):
+    """ItemLookUp 응답 JSON에서 첫 번째 결과를 Book 객체로 변환합니다."""
+    if 'item' not in data:
+        print("책 정보를 찾을 수 없습니다.")
+        return None
+
+    item = data['item'][0]
+
+    # 필요한 정보 추출
+    isbn = item['isbn13']
+    publish_year = item['pubDate'][:4]  # 연도만 추출
+    author = item['author']
+    cover_url = item['cover'].replace("coversum", "cover500")  # cover500으로 치환
+    description = item['description']
+    publisher = item['publisher']
+    title = item['title']
+
+    # Book 객체 생성 및 반환
+    return Book(isbn, title, author, publisher, publish_year, cover_url, description)
+
+
+# 알라딘 조회 결과 캐시 (찾을 수 없는 ISBN은 더 짧게 보관)
+book_info_cache = ResponseCache(
+    "aladin_item_lookup",
+    ttl=float(os.getenv("ALADIN_CACHE_TTL", 24 * 60 * 60)),
+    negative_ttl=float(os.getenv("ALADIN_NEGATIVE_CACHE_TTL", 60 * 60)),
+    encode=vars,
+    decode=lambda data: Book(**data),
+)
+
+
+def _fetch_book_info(isbn):
+    # API 요청 보내기 (실패 시 예외 발생, 결과가 없으면 None)
+    return _parse_item_lookup(aladin.call(_get_json, ITEM_LOOKUP_URL, _item_lookup_params(isbn)))
+
+
+async def _afetch_book_info(isbn):
+    return _parse_item_lookup(await aladin.acall(_aget_json, ITEM_LOOKUP_URL, _item_lookup_params(isbn)))
+
+
+# 알라딘 API로부터 책 정보를 조회하는 함수
+def get_book_info_by_isbn(isbn):
+    try:
+        return book_info_cache.get_or_fetch(isbn, lambda: _fetch_book_info(isbn))
+    except Exception as e:
+        print(f"요청 실패: {e}")
+
+
+# 이벤트 루프를 막지 않는 비동기 버전
+async def aget_book_info_by_isbn(isbn):
+    try:
+        return await book_info_cache.aget_or_fetch(isbn, lambda: _afetch_book_info(isbn))
+    except Exception as e:
+        print(f"요청 실패: {e}")
     
         
-def get_best_sellers():
-    
-    url = "http://www.aladin.co.kr/ttb/api/ItemList.aspx"
-    
-    params = {
+BEST_SELLERS_URL = "http://www.aladin.co.kr/ttb/api/ItemList.aspx"
+# 가져올 베스트셀러 수. 알라딘 ItemList는 한 페이지에 최대 50개까지 주므로 넘으면 여러 페이지를 조회합니다.
+BEST_SELLERS_MAX_RESULTS = int(os.getenv("BEST_SELLERS_MAX_RESULTS", 18))
+ALADIN_PAGE_SIZE = 50
+
+
+def _best_sellers_params(page, page_size):
+    return {
         'ttbkey': os.getenv("ALADIN_TTBKEY"),  # 환경변수에서 가져오거나 기본값 설정
         'QueryType': 'Bestseller',
-        'MaxResults': 18,
-        'start': 1,
+        'MaxResults': page_size,
+        'start': page,
         'SearchTarget': 'Book',
         'output': 'js',
         'Version': '20131101'
     }
-    
+
+
+def _best_sellers_pages(max_results):
+    """(페이지 번호, 페이지 크기) 목록. 모든 페이지가 같은 크기여야 알라딘의 순위 구간이 맞습니다."""
+    page_size = min(max_results, ALADIN_PAGE_SIZE)
+    return [(page, page_size) for page in range(1, -(-max_results // page_size) + 1)]
+
+
+def _parse_best_sellers(data):
+    """ItemList 응답 JSON을 BestBook 목록으로 변환합니다."""
+    book_list = []
+    for item in data.get('item', []):
+        # 필요한 정보 추출
+        isbn = item['isbn13']
+        publish_year = item['pubDate'][:4]  # 연도만 추출
+        author = item['author']
+        cover_url = item['cover'].replace("coversum", "cover500")  # cover500으로 치환
+        description = item['description']
+        publisher = item['publisher']
+        title = item['title']
+        best_rank = item['bestRank']
+
+        book = BestBook(isbn, title, author, publisher, publish_year, cover_url, description, best_rank)
+
+        # 리스트에 책 정보 추가
+        book_list.append(book)
+    return book_list
+
+
+def _merge_best_sellers(pages, max_results):
+    # 페이지 경계에서 같은 책이 두 번 나올 수 있으므로 ISBN 기준으로 한 번만 남깁니다.
+    books = {}
+    for page in pages:
+        for book in page:
+            books.setdefault(book.isbn, book)
+    return sorted(books.values(), key=lambda book: book.best_rank)[:max_results]
+
+
+def get_best_sellers(max_results=BEST_SELLERS_MAX_RESULTS):
     try:
-        # API 요청 보내기
-        response = requests.get(url, params=params)
-        response.raise_for_status()  # HTTP 오류가 있으면 예외 발생
-        data = response.json()  # JSON 응답을 파싱
-
-        # 책 정보를 저장할 리스트
-        book_list = []
-
-        # 18개의 책 정보 추출
-        for item in data['item']:
-            
-            # 필요한 정보 추출
-            isbn = item['isbn13']
-            publish_year = item['pubDate'][:4]  # 연도만 추출
-            author = item['author']
-            cover_url = item['cover'].replace("coversum", "cover500")  # cover500으로 치환
-            description = item['description']
-            publisher = item['publisher']
-            title = item['title']
-            best_rank = item['bestRank']
-            
-            book = BestBook(isbn, title, author, publisher, publish_year, cover_url, description, best_rank)
-        
-            # 리스트에 책 정보 추가
-            book_list.append(book)
+        pages = []
+        for page, page_size in _best_sellers_pages(max_results):
+            # API 요청 보내기
+            data = aladin.call(_get_json, BEST_SELLERS_URL, _best_sellers_params(page, page_size))
+            pages.append(_parse_best_sellers(data))  # JSON 응답을 파싱
+        best_sellers = _merge_best_sellers(pages, max_results)
+        # 같은 책을 다시 조회할 때 알라딘 요청을 생략할 수 있도록 책 정보를 조회 캐시에도 저장
+        for book in best_sellers:
+            book_info_cache.set(book.isbn, book.getBook())
+        return best_sellers
+
+    except Exception as e:
+        print(f"HTTP 요청 중 오류 발생: {e}")
+        return []
+
 
-        return book_list
+# 이벤트 루프를 막지 않는 비동기 버전 (여러 페이지를 동시에 조회)
+async def aget_best_sellers(max_results=BEST_SELLERS_MAX_RESULTS):
+    async def fetch(page, page_size):
+        return _parse_best_sellers(await aladin.acall(_aget_json, BEST_SELLERS_URL, _best_sellers_params(page, page_size)))
 
-    except requests.exceptions.RequestException as e:
+    try:
+        pages = await asyncio.gather(*[fetch(page, page_size) for page, page_size in _best_sellers_pages(max_results)])
+        best_sellers = _merge_best_sellers(pages, max_results)
+        for book in best_sellers:
+            await book_info_cache.aset(book.isbn, book.getBook())
+        return best_sellers
+    except Exception as e:
         print(f"HTTP 요청 중 오류 발생: {e}")
-        return []
\ No newline at end of file
+        return []
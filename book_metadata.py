@@ -0,0 +1,65 @@
+from typing import Iterable, List, Optional
+
+# books 컬렉션 메타데이터 형식 버전. 형식을 바꾸면 올리고 migrate_metadata.py로 기존 책을 다시 씁니다.
+#   1: subCategory/hashtags를 쉼표로 이어 붙인 문자열만 저장
+#   2: 소분류마다 "sub:<소분류>": True 키를 추가해 Chroma where 필터로 거를 수 있게 함
+METADATA_VERSION = 2
+METADATA_VERSION_KEY = "metadataVersion"
+SUB_CATEGORY_KEY_PREFIX = "sub:"
+
+# 표시용 목록 문자열의 구분자
+LIST_SEPARATOR = ", "
+
+
+def sub_category_key(name: str) -> str:
+    return f"{SUB_CATEGORY_KEY_PREFIX}{name}"
+
+
+def split_list(value: Optional[str]) -> List[str]:
+    """쉼표로 이어 붙인 메타데이터 문자열을 목록으로 되돌립니다."""
+    return [item for item in (value or "").split(LIST_SEPARATOR) if item]
+
+
+def build_metadata(book, main_category: str, sub_categories: List[str], hashtags: List[str]) -> dict:
+    """책 하나의 컬렉션 메타데이터를 만듭니다.
+
+    Chroma 메타데이터 값은 문자열/숫자/불리언만 가능하므로, 목록은 표시용 문자열로 남기고
+    필터에 쓰는 소분류는 소분류마다 불리언 키로 따로 저장합니다.
+    """
+    metadata = {
+        "title": book.title,
+        "author": book.author,
+        "isbn": book.isbn,
+        "hashtags": LIST_SEPARATOR.join(hashtags),
+        "mainCategory": main_category,
+        "subCategory": LIST_SEPARATOR.join(sub_categories),
+        METADATA_VERSION_KEY: METADATA_VERSION,
+    }
+    metadata.update({sub_category_key(name): True for name in sub_categories})
+    return metadata
+
+
+def upgrade_metadata(metadata: dict) -> Optional[dict]:
+    """이전 형식의 메타데이터를 현재 형식으로 바꾼 새 dict를 반환합니다. 이미 현재 형식이면 None을 반환합니다."""
+    if metadata.get(METADATA_VERSION_KEY) == METADATA_VERSION:
+        return None
+    upgraded = dict(metadata)
+    upgraded.update({sub_category_key(name): True for name in split_list(metadata.get("subCategory"))})
+    upgraded[METADATA_VERSION_KEY] = METADATA_VERSION
+    return upgraded
+
+
+def _combine(operator, conditions):
+    # Chroma의 $and/$or는 조건이 두 개 이상이어야 합니다.
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {operator: conditions}
+
+
+def category_where(main_category: Optional[str] = None, sub_categories: Optional[Iterable[str]] = None) -> Optional[dict]:
+    """대분류가 같고, 주어진 소분류 중 하나 이상에 속한 책만 남기는 Chroma where 필터를 만듭니다."""
+    conditions = [{"mainCategory": main_category}] if main_category else []
+    subs = [{sub_category_key(name): True} for name in dict.fromkeys(sub_categories or [])]
+    if subs:
+        conditions.append(_combine("$or", subs))
+    return _combine("$and", conditions)
@@ -0,0 +1,62 @@
+import os
+
+from fastapi import HTTPException
+
+from blocking import run_blocking
+from book_info import aget_book_info_by_isbn
+from category_classifier import aclassify_category
+from crawling import aget_hashtags
+from database_conn import insert_book_info_to_db
+from pipeline import Stage, run_pipeline
+
+# /add-book 단계별 제한 시간(초)
+ADD_BOOK_FETCH_TIMEOUT = float(os.getenv("ADD_BOOK_FETCH_TIMEOUT", 15))
+ADD_BOOK_CLASSIFY_TIMEOUT = float(os.getenv("ADD_BOOK_CLASSIFY_TIMEOUT", 60))
+ADD_BOOK_SAVE_TIMEOUT = float(os.getenv("ADD_BOOK_SAVE_TIMEOUT", 30))
+
+
+async def add_book(chroma_manager, isbn):
+    """ISBN 하나를 조회/분류해서 MySQL과 Chroma에 저장하고 (결과 메시지, 단계별 소요 시간)을 반환합니다.
+
+    API 요청과 작업 큐 워커가 함께 사용하며, 실패하면 PipelineError가 발생합니다.
+    """
+    async def fetch_hashtags():
+        # 수집에 실패하면 None이 오므로, 이후 단계는 모두 빈 목록을 받도록 여기서 한 번만 바꿉니다.
+        return (await aget_hashtags(isbn)) or []
+
+    async def classify(book, hashtags):
+        if book is None:
+            raise HTTPException(status_code=404, detail="책 정보를 찾을 수 없습니다.")
+        return await aclassify_category(book.title, book.author, book.isbn, book.description, hashtags)
+
+    async def save_mysql(book, hashtags, classify):
+        _, sub_category = classify
+        saved = await run_blocking(insert_book_info_to_db, book, category_names=sub_category, hashtags=hashtags)
+        if not saved:
+            # 트랜잭션이 롤백되었으므로 성공으로 응답하지 않습니다 (작업 큐에서는 다시 시도).
+            raise HTTPException(status_code=500, detail="책 정보를 데이터베이스에 저장하지 못했습니다.")
+
+    async def save_chroma(book, hashtags, classify, save_mysql):
+        main_category, sub_category = classify
+        return await chroma_manager.aadd_book(book, main_category, sub_category, hashtags)
+
+    # 알라딘 조회와 교보문고 해시태그 수집은 서로 독립적이므로 동시에 실행합니다.
+    # Chroma에 있으면 이미 등록된 책으로 보므로, Chroma 저장은 MySQL 저장이 성공한 뒤에만 합니다.
+    stages = {
+        "book": Stage(lambda: aget_book_info_by_isbn(isbn), timeout=ADD_BOOK_FETCH_TIMEOUT),
+        "hashtags": Stage(fetch_hashtags, timeout=ADD_BOOK_FETCH_TIMEOUT),
+        "classify": Stage(classify, deps=("book", "hashtags"), timeout=ADD_BOOK_CLASSIFY_TIMEOUT),
+        "save_mysql": Stage(save_mysql, deps=("book", "hashtags", "classify"), timeout=ADD_BOOK_SAVE_TIMEOUT),
+        "save_chroma": Stage(save_chroma, deps=("book", "hashtags", "classify", "save_mysql"), timeout=ADD_BOOK_SAVE_TIMEOUT),
+    }
+    results, timings = await run_pipeline(stages)
+    return results["save_chroma"], timings
+
+
+async def classify_book(title, author, isbn, description):
+    """해시태그를 수집해서 책의 카테고리를 분류하고 /classify 응답 형태로 반환합니다."""
+    hashtags = (await aget_hashtags(isbn)) or []  # ISBN을 이용해 해시태그 가져오기
+
+    # 카테고리 분류 함수 호출
+    main, sub = await aclassify_category(title, author, isbn, description, hashtags)
+    return {"title": title, "main_category": main, "sub_category": sub}
@@ -0,0 +1,179 @@
+"""여러 ISBN을 배치 단위로 수집/분류/저장하는 대량 등록 도구입니다.
+
+사용 예:
+    python bulk_ingest.py isbns.txt --batch-size 20 --state ingest_state.jsonl
+    python bulk_ingest.py 9788936434120 9791190090018
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from blocking import run_blocking
+from book_info import aget_book_info_by_isbn
+from category_classifier import aclassify_category
+from chroma_manager import BOOK_ADDED_MESSAGE, BOOK_EXISTS_MESSAGE
+from clients import aget_chroma_manager, close_clients
+from crawling import aget_hashtags
+from database_conn import insert_books_info_to_db
+from http_client import close_async_client
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 20))
+# API로 받을 수 있는 배치 크기 상한 (한 배치가 하나의 트랜잭션/임베딩 요청이 됨)
+BULK_MAX_BATCH_SIZE = int(os.getenv("BULK_MAX_BATCH_SIZE", 100))
+BULK_FETCH_CONCURRENCY = int(os.getenv("BULK_FETCH_CONCURRENCY", 8))
+BULK_CLASSIFY_CONCURRENCY = int(os.getenv("BULK_CLASSIFY_CONCURRENCY", 4))
+
+# 다시 실행할 때 건너뛰는 완료 상태
+DONE_STATUSES = {"added", "exists"}
+
+
+def load_state(state_path):
+    """이전 실행에서 기록한 ISBN별 상태를 읽습니다. 같은 ISBN은 마지막 기록이 우선합니다."""
+    state = {}
+    if state_path and os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    state[record["isbn"]] = record["status"]
+    return state
+
+
+def _append_state(state_path, results):
+    if not state_path:
+        return
+    with open(state_path, 'a', encoding='utf-8') as file:
+        for isbn, result in results.items():
+            file.write(json.dumps({"isbn": isbn, **result}, ensure_ascii=False) + "\n")
+
+
+async def _ingest_batch(chroma_manager, isbns, fetch_semaphore, classify_semaphore, skip_existing=True):
+    results = {}
+
+    # 이미 Chroma에 있는 책은 외부 요청 없이 건너뜁니다.
+    existing = await run_blocking(chroma_manager.existing_isbns, isbns) if skip_existing else set()
+    for isbn in existing:
+        results[isbn] = {"status": "exists"}
+
+    async def enrich(isbn):
+        try:
+            async with fetch_semaphore:
+                book, hashtags = await asyncio.gather(aget_book_info_by_isbn(isbn), aget_hashtags(isbn))
+            if book is None:
+                results[isbn] = {"status": "not_found"}
+                return None
+            hashtags = hashtags or []
+            async with classify_semaphore:
+                main_category, sub_category = await aclassify_category(
+                    book.title, book.author, book.isbn, book.description, hashtags
+                )
+            if main_category is None:
+                results[isbn] = {"status": "failed", "error": "classification failed"}
+                return None
+            return book, main_category, sub_category, hashtags
+        except Exception as e:
+            results[isbn] = {"status": "failed", "error": str(e)}
+            return None
+
+    enriched = await asyncio.gather(*[enrich(isbn) for isbn in isbns if isbn not in existing])
+    entries = [entry for entry in enriched if entry is not None]
+    if not entries:
+        return results
+
+    # MySQL은 배치 전체를 하나의 트랜잭션으로, Chroma는 한 번의 임베딩 요청과 add로 저장합니다.
+    saved = await run_blocking(insert_books_info_to_db, [(book, sub, hashtags) for book, _, sub, hashtags in entries])
+    if not saved:
+        # 책 하나 때문에 배치 전체가 실패했을 수 있으므로 한 권씩 다시 저장해 실패한 책만 골라냅니다.
+        stored = []
+        for entry in entries:
+            book, _, sub, hashtags = entry
+            if await run_blocking(insert_books_info_to_db, [(book, sub, hashtags)]):
+                stored.append(entry)
+            else:
+                results[book.isbn] = {"status": "failed", "error": "database write failed"}
+        entries = stored
+        if not entries:
+            return results
+
+    messages = await chroma_manager.aadd_books(entries)
+    for book, *_ in entries:
+        message = messages[book.isbn]
+        if message == BOOK_ADDED_MESSAGE:
+            results[book.isbn] = {"status": "added"}
+        elif message == BOOK_EXISTS_MESSAGE:
+            results[book.isbn] = {"status": "exists"}
+        else:
+            results[book.isbn] = {"status": "failed", "error": message}
+    return results
+
+
+async def ingest_isbns(chroma_manager, isbns, batch_size=BULK_BATCH_SIZE, state_path=None,
+                       fetch_concurrency=BULK_FETCH_CONCURRENCY, classify_concurrency=BULK_CLASSIFY_CONCURRENCY,
+                       skip_existing=True, on_progress=None):
+    """ISBN 목록을 배치 단위로 등록하고 {isbn: {"status": ..., ...}}를 반환합니다.
+
+    `state_path`를 주면 배치가 끝날 때마다 결과를 기록하고, 다시 실행할 때 완료된 ISBN은 건너뜁니다.
+    `skip_existing`이 False이면 Chroma에 이미 있는 책도 MySQL에 다시 저장합니다 (Chroma에는 추가하지 않음).
+    `on_progress`(코루틴 함수)를 주면 배치가 끝날 때마다 (처리한 수, 전체 수, 지금까지의 요약)으로 호출해 기다립니다.
+    """
+    state = load_state(state_path)
+    results = {isbn: {"status": state[isbn], "skipped": True} for isbn in isbns if state.get(isbn) in DONE_STATUSES}
+    pending = list(dict.fromkeys(isbn for isbn in isbns if isbn not in results))
+
+    fetch_semaphore = asyncio.Semaphore(fetch_concurrency)
+    classify_semaphore = asyncio.Semaphore(classify_concurrency)
+    for offset in range(0, len(pending), batch_size):
+        batch = pending[offset:offset + batch_size]
+        batch_results = await _ingest_batch(chroma_manager, batch, fetch_semaphore, classify_semaphore, skip_existing)
+        _append_state(state_path, batch_results)
+        results.update(batch_results)
+        print(f"Bulk ingest progress: {min(offset + batch_size, len(pending))}/{len(pending)}")
+        if on_progress is not None:
+            await on_progress(min(offset + batch_size, len(pending)), len(pending), summarize(results))
+    return results
+
+
+def summarize(results) -> dict:
+    summary = {}
+    for result in results.values():
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return summary
+
+
+def read_isbns(sources):
+    """명령행 인자로 받은 ISBN 또는 ISBN 목록 파일(한 줄에 하나)을 읽습니다."""
+    isbns = []
+    for source in sources:
+        if os.path.isfile(source):
+            with open(source, 'r', encoding='utf-8') as file:
+                isbns.extend(line.strip() for line in file if line.strip())
+        else:
+            isbns.append(source.strip())
+    return isbns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ISBN 목록을 배치로 등록합니다.")
+    parser.add_argument("sources", nargs="+", help="ISBN 또는 ISBN 목록 파일")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument("--state", default="bulk_ingest_state.jsonl", help="진행 상태 기록 파일 (재시작 시 이어서 처리)")
+    args = parser.parse_args()
+    if args.batch_size <= 0:
+        parser.error("--batch-size must be greater than 0")
+
+    async def run():
+        try:
+            return await ingest_isbns(await aget_chroma_manager(), read_isbns(args.sources), args.batch_size, args.state)
+        finally:
+            close_clients()
+            await close_async_client()
+
+    results = asyncio.run(run())
+    for isbn, result in results.items():
+        print(isbn, result)
+    print(summarize(results))
+
+
+if __name__ == "__main__":
+    main()
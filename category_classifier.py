@@ -1,37 +1,40 @@
 from dotenv import load_dotenv
-import openai
 import os
-from langchain_openai import ChatOpenAI
+import threading
+from typing import List, Literal
+from pydantic import BaseModel, Field, ValidationError
+
+from category_registry import SUB_CATEGORIES, TAXONOMY, CategoryRegistry, normalize_category
+from outbound import get_upstream
+from response_cache import ResponseCache
 
 load_dotenv()
 
-# OpenAI API Key 설정
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# 분류에 사용할 모델 (클라이언트는 처음 분류할 때 clients.py에서 만듭니다)
 model_engine = "gpt-4"
-client = ChatOpenAI(model_name=model_engine)
+# OpenAI 호출 정책 (속도 제한, 제한 시간, 재시도, 서킷 브레이커)
+openai_upstream = get_upstream("openai")
 
-# 카테고리 분류 함수
-def classify_category(title, author, isbn, description, hashtags):
-    base_prompt = """웹사이트에서 이 책의 정보를 검색해서 카테고리를 분류해줘.
-    분류될 수 있는 카테고리의 대분류는 다음과 같아: 소설, 시/에세이, 자기계발, 인문, 여행, 철학, 사회, 과학, 역사, 판타지/무협지.
+# 분류 프롬프트나 출력 스키마를 바꾸면 함께 올려서 캐시된 이전 결과를 쓰지 않도록 합니다.
+PROMPT_VERSION = "v2-structured"
+CLASSIFIER_LLM_MAX_ATTEMPTS = int(os.getenv("CLASSIFIER_LLM_MAX_ATTEMPTS", 3))
+
+# 분류 결과를 O(1)로 검증/정규화하기 위한 대분류/소분류 이름 집합
+main_category_registry = CategoryRegistry(names=TAXONOMY)
+sub_category_registry = CategoryRegistry(names=SUB_CATEGORIES)
+
+_main_categories_text = ", ".join(TAXONOMY)
+_sub_categories_text = ",\n".join(f"    {main} - {', '.join(subs)}" for main, subs in TAXONOMY.items())
+
+# 카테고리 분류 프롬프트
+base_prompt = """웹사이트에서 이 책의 정보를 검색해서 카테고리를 분류해줘.
+    분류될 수 있는 카테고리의 대분류는 다음과 같아: """ + _main_categories_text + """.
     각 대분류에 따른 소분류는 다음과 같아:
-    소설 - 추리/스릴러, SF, 판타지, 공포, 영화/드라마 원작, 역사, 사랑, 청소년,
-    시/에세이 - 시, 일상, 위로, 직업, 여행, 사랑/가족, 음식,
-    자기계발 - 말하기/협상/프레젠테이션, 시간관리, 습관, 글쓰기, 독서, 사고법, 리더십, 직장인, 기획, 자존감/가치관,
-    인문 - 인문학, 문명, 문화, 심리학, 인간/인류, 신화, 언어, 사랑, 영화, 예체능,
-    여행 - 한국, 일본, 중국, 대만/홍콩, 미국, 호주, 남미, 동남아, 유럽, 중동/아프리카, 기타 국가,
-    철학 - 동양, 서양, 예술/문화, 정치/경제,
-    사회 - 사회학, 정치, 법, 젠더/페미니즘, 노동, 국가, 교육, 범죄, 환경, 세계, 사회문제, 미디어, 시사 매거진,
-    과학 - 물리학/공학, 수학, 화학, 천문학/지구과학, 생명과학, 인체/뇌, 과학 매거진,
-    역사 - 한국 고대사, 조선사, 한국 근현대사, 세계사,
-    판타지/무협지 - 무협, 퓨전 판타지, 현대 판타지, 해외 판타지, 게임 판타지, 전쟁/대체역사, 라이트노벨.
+""" + _sub_categories_text + """.
     카테고리의 대분류는 하나만 가질 수 있고, 소분류는 여러 개 가질 수 있어.
     책의 카테고리를 분류해줘. 
-    형식은 '대분류 - 소분류1, 소분류2, 소분류3'으로 해줘.
-
-    예시:
-    대분류 - 소분류1, 소분류2, 소분류3
-    반드시 예시 형식에 맞춰 응답해줘.
+    대분류는 main_category에, 소분류는 sub_categories에 담아줘.
+    소분류는 반드시 고른 대분류에 속한 것 중에서만 골라줘.
 
     책 정보:
     - 제목: {title}
@@ -41,28 +44,222 @@ def classify_category(title, author, isbn, description, hashtags):
     - 해시태그: {hashtags}
     """
 
+class CategoryClassification(BaseModel):
+    """책의 카테고리 분류 결과"""
+    main_category: Literal[tuple(TAXONOMY)] = Field(description="대분류 하나")
+    sub_categories: List[Literal[tuple(SUB_CATEGORIES)]] = Field(
+        description="고른 대분류에 속한 소분류 목록"
+    )
+
+_structured_client = None
+
+def get_structured_client():
+    """분류 기준 밖의 값은 스키마 검증 단계에서 걸러지도록 구조화된 출력 클라이언트를 반환합니다."""
+    global _structured_client
+    if _structured_client is None:
+        from clients import get_chat_model
+
+        _structured_client = get_chat_model(model_engine).with_structured_output(CategoryClassification)
+    return _structured_client
+
+def _retryable_errors():
+    from langchain_core.exceptions import OutputParserException
+
+    return OutputParserException, ValidationError, ValueError
+
+def _validate(result: CategoryClassification):
+    """고른 대분류에 속한 소분류만 남기고, 하나도 없으면 ValueError를 발생시킵니다."""
+    allowed = TAXONOMY[result.main_category]
+    sub_categories = list(dict.fromkeys(sub for sub in result.sub_categories if sub in allowed))
+    if not sub_categories:
+        raise ValueError(f"no sub_categories belong to {result.main_category}: {result.sub_categories}")
+    return result.main_category, sub_categories
+
+def _llm_prompt(title, author, isbn, description, hashtags):
     # 책 정보 포함
-    full_prompt = base_prompt.format(title=title, author=author, isbn=isbn, description=description, hashtags=hashtags)
-
-    # OpenAI API 호출
-    response = client(full_prompt)
-    # 응답 처리
-    response_text = response.content.strip()
-    
-    if not response_text:
-        return None, []  # 빈 응답 처리
-
-    # 주어진 형식에 맞게 응답 파싱
-    try:
-        print(response_text)
-        if "대분류" not in response_text:
-            # 사회 - 사회학, 경제
-            main_category = response_text.split(" -")[0].strip()
-            sub_categories = response_text.split(" -")[1].strip().split(", ")
+    return base_prompt.format(title=title, author=author, isbn=isbn, description=description, hashtags=hashtags)
+
+def _llm_classify(title, author, isbn, description, hashtags):
+    prompt = _llm_prompt(title, author, isbn, description, hashtags)
+    structured_client, retryable = get_structured_client(), _retryable_errors()
+    # 응답이 스키마나 분류 기준에 맞지 않으면 정해진 횟수까지만 다시 요청합니다.
+    for attempt in range(1, CLASSIFIER_LLM_MAX_ATTEMPTS + 1):
+        try:
+            return _validate(openai_upstream.call(structured_client.invoke, prompt))
+        except retryable as e:
+            print(f"분류 응답 검증 실패 ({attempt}/{CLASSIFIER_LLM_MAX_ATTEMPTS}): {e}")
+    return None, []
+
+async def _allm_classify(title, author, isbn, description, hashtags):
+    prompt = _llm_prompt(title, author, isbn, description, hashtags)
+    structured_client, retryable = get_structured_client(), _retryable_errors()
+    for attempt in range(1, CLASSIFIER_LLM_MAX_ATTEMPTS + 1):
+        try:
+            return _validate(await openai_upstream.acall(structured_client.ainvoke, prompt))
+        except retryable as e:
+            print(f"분류 응답 검증 실패 ({attempt}/{CLASSIFIER_LLM_MAX_ATTEMPTS}): {e}")
+    return None, []
+
+
+# 계층형 분류: 해시태그 키워드 -> 기존 도서 kNN 투표 -> GPT 순으로 시도하고,
+# 앞 단계의 신뢰도가 기준값 이상이면 LLM 호출 없이 바로 결과를 반환합니다.
+CLASSIFIER_CONFIDENCE_THRESHOLD = float(os.getenv("CLASSIFIER_CONFIDENCE_THRESHOLD", 0.75))
+CLASSIFIER_KEYWORD_MIN_MATCHES = int(os.getenv("CLASSIFIER_KEYWORD_MIN_MATCHES", 2))
+CLASSIFIER_KNN_K = int(os.getenv("CLASSIFIER_KNN_K", 10))
+
+# 소분류 이름의 각 부분('추리/스릴러' -> '추리', '스릴러')이 속한 (대분류, 소분류) 목록
+_keyword_index = {}
+for _main, _subs in TAXONOMY.items():
+    for _sub in _subs:
+        for _part in _sub.split("/"):
+            _part = normalize_category(_part)
+            if len(_part) >= 2:
+                _keyword_index.setdefault(_part, []).append((_main, _sub))
+
+_neighbour_search = None
+_aneighbour_search = None
+_tier_stats = {"keyword": 0, "knn": 0, "llm": 0}
+_tier_lock = threading.Lock()
+
+def set_neighbour_search(search, asearch=None):
+    """kNN 단계에서 쓸 이웃 검색 함수를 등록합니다. 함수는 (text, k)를 받아 [(metadata, distance), ...]를 반환해야 합니다."""
+    global _neighbour_search, _aneighbour_search
+    _neighbour_search = search
+    _aneighbour_search = asearch
+
+def classifier_stats() -> dict:
+    """각 단계가 분류를 끝낸 횟수와 비율을 반환합니다."""
+    with _tier_lock:
+        stats = dict(_tier_stats)
+    total = sum(stats.values())
+    stats["total"] = total
+    stats["llm_rate"] = stats["llm"] / total if total else 0.0
+    return stats
+
+def _record(tier):
+    with _tier_lock:
+        _tier_stats[tier] += 1
+
+def _vote(votes):
+    """{대분류: [점수, {소분류: 점수}]} 투표 결과에서 (대분류, 소분류 목록, 신뢰도)를 계산합니다."""
+    total = sum(score for score, _ in votes.values())
+    if not total:
+        return None, [], 0.0
+    main_category, (score, sub_scores) = max(votes.items(), key=lambda item: item[1][0])
+    # 선택된 대분류 안에서 가장 많은 표를 받은 소분류의 절반 이상을 받은 소분류만 남깁니다.
+    ranked = sorted(sub_scores.items(), key=lambda item: -item[1])
+    sub_categories = [sub for sub, sub_score in ranked if sub_score >= ranked[0][1] / 2] if ranked else []
+    return main_category, sub_categories, score / total
+
+def keyword_classify(hashtags):
+    """해시태그를 분류 기준의 소분류 이름과 대조해 (대분류, 소분류 목록, 신뢰도)를 반환합니다."""
+    votes = {}
+    matched_tags = 0
+    for tag in hashtags or []:
+        canonical = sub_category_registry.canonical(tag)
+        if canonical is not None:
+            matches = {(main, canonical) for main, subs in TAXONOMY.items() if canonical in subs}
         else:
-            main_category = response_text.split("\n")[0].split(" -")[1].strip()
-            sub_categories = response_text.split("\n")[1].split(" -")[1].strip().split(", ")
+            normalized = normalize_category(tag)
+            matches = {pair for part, pairs in _keyword_index.items() if part in normalized for pair in pairs}
+        if not matches:
+            continue
+        matched_tags += 1
+        weight = 1 / len(matches)  # 여러 대분류에 걸친 이름은 표를 나눠서 줍니다.
+        for main, sub in matches:
+            entry = votes.setdefault(main, [0.0, {}])
+            entry[0] += weight
+            entry[1][sub] = entry[1].get(sub, 0.0) + weight
+
+    if matched_tags < CLASSIFIER_KEYWORD_MIN_MATCHES:
+        return None, [], 0.0
+    return _vote(votes)
+
+def knn_classify(neighbours):
+    """가까운 기존 도서들의 분류를 거리 가중 투표해 (대분류, 소분류 목록, 신뢰도)를 반환합니다."""
+    votes = {}
+    for metadata, distance in neighbours:
+        main = metadata.get("mainCategory")
+        if main not in main_category_registry:
+            continue
+        weight = 1 / (1 + distance)
+        entry = votes.setdefault(main, [0.0, {}])
+        entry[0] += weight
+        for sub in filter(None, (metadata.get("subCategory") or "").split(", ")):
+            entry[1][sub] = entry[1].get(sub, 0.0) + weight
+    return _vote(votes)
+
+def _neighbour_text(title, author, description, hashtags):
+    return f"title: {title}\nauthor: {author}\ndescription: {description}\nhashtags: {', '.join(hashtags or [])}"
+
+def _confident(main_category, sub_categories, confidence):
+    return main_category is not None and bool(sub_categories) and confidence >= CLASSIFIER_CONFIDENCE_THRESHOLD
+
+def _classify_tiers(title, author, isbn, description, hashtags):
+    main_category, sub_categories, confidence = keyword_classify(hashtags)
+    if _confident(main_category, sub_categories, confidence):
+        _record("keyword")
+        return main_category, sub_categories
+
+    if _neighbour_search is not None:
+        try:
+            neighbours = _neighbour_search(_neighbour_text(title, author, description, hashtags), CLASSIFIER_KNN_K)
+            main_category, sub_categories, confidence = knn_classify(neighbours)
+            if _confident(main_category, sub_categories, confidence):
+                _record("knn")
+                return main_category, sub_categories
+        except Exception as e:
+            print(f"kNN 분류 중 오류 발생: {e}")
+
+    _record("llm")
+    return _llm_classify(title, author, isbn, description, hashtags)
+
+async def _aclassify_tiers(title, author, isbn, description, hashtags):
+    main_category, sub_categories, confidence = keyword_classify(hashtags)
+    if _confident(main_category, sub_categories, confidence):
+        _record("keyword")
         return main_category, sub_categories
-    except IndexError:
-        print("응답 형식이 예상과 다릅니다.")
-        return None, []
+
+    if _aneighbour_search is not None:
+        try:
+            neighbours = await _aneighbour_search(_neighbour_text(title, author, description, hashtags), CLASSIFIER_KNN_K)
+            main_category, sub_categories, confidence = knn_classify(neighbours)
+            if _confident(main_category, sub_categories, confidence):
+                _record("knn")
+                return main_category, sub_categories
+        except Exception as e:
+            print(f"kNN 분류 중 오류 발생: {e}")
+
+    _record("llm")
+    return await _allm_classify(title, author, isbn, description, hashtags)
+
+
+# ISBN별 분류 결과 캐시. 프롬프트/분류 기준이 바뀌면 PROMPT_VERSION을 올려서 이전 결과를 무시합니다.
+classification_cache = ResponseCache(
+    "classification",
+    ttl=float(os.getenv("CLASSIFICATION_CACHE_TTL", 90 * 24 * 60 * 60)),
+    negative_ttl=0,  # 실패한 분류는 저장하지 않음
+    encode=list,
+    decode=tuple,
+)
+
+def _cache_key(isbn):
+    return f"{PROMPT_VERSION}:{isbn}"
+
+def _or_none(result):
+    return result if result[0] is not None else None
+
+# 카테고리 분류 함수
+def classify_category(title, author, isbn, description, hashtags):
+    result = classification_cache.get_or_fetch(
+        _cache_key(isbn), lambda: _or_none(_classify_tiers(title, author, isbn, description, hashtags))
+    )
+    return result or (None, [])
+
+# 이벤트 루프를 막지 않는 비동기 버전
+async def aclassify_category(title, author, isbn, description, hashtags):
+    async def fetch():
+        return _or_none(await _aclassify_tiers(title, author, isbn, description, hashtags))
+
+    result = await classification_cache.aget_or_fetch(_cache_key(isbn), fetch)
+    return result or (None, [])
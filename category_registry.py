@@ -0,0 +1,113 @@
+import os
+import re
+import threading
+import time
+from types import MappingProxyType
+from typing import Iterable, Optional
+
+CATEGORIES_PATH = os.getenv(
+    "CATEGORIES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "categories.txt")
+)
+# 파일 변경 여부를 확인하는 최소 간격(초)
+CATEGORIES_RELOAD_INTERVAL = float(os.getenv("CATEGORIES_RELOAD_INTERVAL", 5))
+
+# 카테고리 분류 기준 (대분류 -> 소분류 목록)
+TAXONOMY = {
+    "소설": ["추리/스릴러", "SF", "판타지", "공포", "영화/드라마 원작", "역사", "사랑", "청소년"],
+    "시/에세이": ["시", "일상", "위로", "직업", "여행", "사랑/가족", "음식"],
+    "자기계발": ["말하기/협상/프레젠테이션", "시간관리", "습관", "글쓰기", "독서", "사고법", "리더십", "직장인", "기획", "자존감/가치관"],
+    "인문": ["인문학", "문명", "문화", "심리학", "인간/인류", "신화", "언어", "사랑", "영화", "예체능"],
+    "여행": ["한국", "일본", "중국", "대만/홍콩", "미국", "호주", "남미", "동남아", "유럽", "중동/아프리카", "기타 국가"],
+    "철학": ["동양", "서양", "예술/문화", "정치/경제"],
+    "사회": ["사회학", "정치", "법", "젠더/페미니즘", "노동", "국가", "교육", "범죄", "환경", "세계", "사회문제", "미디어", "시사 매거진"],
+    "과학": ["물리학/공학", "수학", "화학", "천문학/지구과학", "생명과학", "인체/뇌", "과학 매거진"],
+    "역사": ["한국 고대사", "조선사", "한국 근현대사", "세계사"],
+    "판타지/무협지": ["무협", "퓨전 판타지", "현대 판타지", "해외 판타지", "게임 판타지", "전쟁/대체역사", "라이트노벨"],
+}
+
+SUB_CATEGORIES = list(dict.fromkeys(sub for subs in TAXONOMY.values() for sub in subs))
+
+# '추리 / 스릴러', '추리／스릴러', '추리·스릴러' 등을 같은 이름으로 취급하기 위한 구분자
+_SEPARATORS = re.compile(r"\s*[/／·∙ㆍ]\s*")
+
+
+def normalize_category(name: str) -> str:
+    """공백과 '/' 변형을 정리한 비교용 이름을 반환합니다."""
+    name = _SEPARATORS.sub("/", name.strip().replace("#", ""))
+    return "".join(name.split()).lower()
+
+
+class CategoryRegistry:
+    """카테고리 이름 집합을 불변 해시 집합으로 보관하고 O(1)로 포함 여부를 확인합니다.
+
+    파일에서 읽은 경우 `reload_interval`마다 수정 시각을 확인해 바뀌었으면 다시 읽습니다.
+    """
+
+    def __init__(self, path: Optional[str] = None, names: Optional[Iterable[str]] = None,
+                 reload_interval: float = CATEGORIES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        if path is not None:
+            self._load_file()
+        else:
+            self._set(names or [])
+
+    def _set(self, names):
+        names = [name.strip() for name in names if name.strip()]
+        # 읽는 쪽은 잠금 없이 참조만 바꿔치기된 두 객체를 봅니다.
+        self._names = frozenset(names)
+        self._by_normalized = MappingProxyType({normalize_category(name): name for name in names})
+
+    def _load_file(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self._set(file.read().splitlines())
+            self._mtime = mtime
+        except Exception as e:
+            print(f"카테고리 파일을 읽는 중 오류 발생: {e}")
+            if self._mtime is None:
+                self._set([])
+
+    def _maybe_reload(self):
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            try:
+                changed = os.stat(self.path).st_mtime != self._mtime
+            except OSError:
+                changed = False
+            if changed:
+                self._load_file()
+                print(f"카테고리 파일을 다시 읽었습니다: {self.path} ({len(self._names)}개)")
+
+    @property
+    def names(self) -> frozenset:
+        self._maybe_reload()
+        return self._names
+
+    def canonical(self, name: str) -> Optional[str]:
+        """정확히 일치하거나 정규화한 이름이 일치하는 카테고리의 원래 이름을 반환합니다."""
+        self._maybe_reload()
+        if name in self._names:
+            return name
+        return self._by_normalized.get(normalize_category(name))
+
+    def __contains__(self, name: str) -> bool:
+        return self.canonical(name) is not None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+# 교보문고 표준 카테고리 (해시태그에서 제외할 목록). 시작 시 한 번 읽고 파일이 바뀌면 다시 읽습니다.
+standard_categories = CategoryRegistry(path=CATEGORIES_PATH)
@@ -1,25 +1,83 @@
 from datetime import datetime, timedelta
 import os
+import time
+import zlib
 from typing import List, Optional
 from fastapi import HTTPException
-from database_conn import get_book_id_by_isbn, get_member_preferences, save_recommendation
-from langchain_openai import OpenAIEmbeddings
-import chromadb
+from database_conn import get_member_preferences, save_recommendation
+from database_conn import get_all_member_preferences, get_book_ids_by_isbns, get_recommended_book_ids, save_recommendations
+from blocking import run_blocking
+from book_metadata import build_metadata, category_where
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from outbound import get_upstream
+from preference_store import MemberPreferenceStore
+from ranking import mmr
+from subcategory_embeddings import SubCategoryEmbeddings
+from vector_index import get_vector_index
+
+BOOK_ADDED_MESSAGE = "책 정보가 성공적으로 추가되었습니다."
+BOOK_EXISTS_MESSAGE = "이미 존재하는 책 정보입니다."
+
+# 책 정보 조회 결과에 담기는 항목
+BOOK_FIELDS = ("title", "author", "isbn", "description", "hashtags", "mainCategory", "subCategory")
+
+# 유사 도서 조회에서 한 번에 받을 수 있는 결과 수 상한
+SIMILAR_BOOKS_MAX_K = int(os.getenv("SIMILAR_BOOKS_MAX_K", 100))
+
+# 추천 후보 수, MMR 가중치(1에 가까울수록 유사도 우선), 반환할 순위 수, 같은 선호 회원 간 분산 범위
+RECOMMEND_CANDIDATES = int(os.getenv("RECOMMEND_CANDIDATES", 20))
+RECOMMEND_MMR_LAMBDA = float(os.getenv("RECOMMEND_MMR_LAMBDA", 0.7))
+RECOMMEND_RESULTS = int(os.getenv("RECOMMEND_RESULTS", 5))
+RECOMMEND_ROTATION_WINDOW = int(os.getenv("RECOMMEND_ROTATION_WINDOW", 3))
+# 이 기간(일) 안에 추천한 책은 다시 추천하지 않습니다. 그보다 오래된 이력은 읽지 않습니다.
+RECOMMEND_EXCLUSION_DAYS = int(os.getenv("RECOMMEND_EXCLUSION_DAYS", 180))
+
+# 켜면 회원이 선호하는 소분류에 속한 책 안에서 추천 후보를 찾습니다 (모자라면 전체 검색 결과로 채움).
+# 소분류 필터 키가 있어야 하므로 migrate_metadata.py로 기존 책을 이전한 뒤에 켭니다.
+RECOMMEND_FILTER_BY_PREFERENCE = os.getenv("RECOMMEND_FILTER_BY_PREFERENCE", "false").lower() in ("1", "true", "yes")
+
+# 켜면 검색/조회를 Chroma 대신 프로세스 안의 NumPy 인덱스(vector_index.py)에서 처리합니다.
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+
+def in_shard(member_id, shard: tuple) -> bool:
+    """회원 ID를 해시해서 (번호, 전체 수) 샤드에 속하는지 확인합니다. 숫자/문자열 ID 모두 같은 샤드가 됩니다."""
+    index, count = shard
+    return zlib.crc32(str(member_id).encode()) % count == index
+
+def _exclusion_start(recommendation_date):
+    """다시 추천하지 않을 이력의 시작 날짜입니다."""
+    return recommendation_date - timedelta(days=RECOMMEND_EXCLUSION_DAYS)
 
 class ChromaManager:
     def __init__(self, persist_directory: str, collection_name: str):
+        # 무거운 모듈은 매니저를 처음 만들 때 import합니다 (clients.get_chroma_manager 참고).
+        import chromadb
+        from langchain_openai import OpenAIEmbeddings
+
         self.client = chromadb.PersistentClient(path=persist_directory)
         self.collection = self.client.get_collection(collection_name)
-        self.embedding_function = OpenAIEmbeddings(
-            openai_api_key=os.getenv("OPENAI_API_KEY"),
+        # 같은 텍스트는 다시 임베딩하지 않도록 로컬 캐시를 거치고, 재시도와 제한 시간은 outbound.py 정책을 따릅니다.
+        openai_upstream = get_upstream("openai")
+        self.embedding_function = CachedEmbeddings(
+            OpenAIEmbeddings(
+                openai_api_key=os.getenv("OPENAI_API_KEY"), request_timeout=openai_upstream.timeout, max_retries=0
+            ),
+            EmbeddingCache(),
+            upstream=openai_upstream,
         )
+        # 회원별 선호 벡터 저장소 (같은 Chroma 클라이언트의 별도 컬렉션)
+        self.sub_category_embeddings = SubCategoryEmbeddings(self.embedding_function)
+        self.preference_store = MemberPreferenceStore(self.client, self.sub_category_embeddings)
+        # 인덱스 모드에서는 스냅샷을 memmap으로 열고, 스냅샷이 없을 때만 컬렉션에서 새로 만듭니다.
+        self.vector_index = get_vector_index(self.collection) if VECTOR_INDEX_ENABLED else None
 
-    def add_book(self, book, main_category: str, sub_category: Optional[List[str]], hashtags: Optional[List[str]]) -> str:
-        # ISBN으로 책 정보가 이미 존재하는지 확인
-        existing_books = self.collection.get(ids=[book.isbn])
+    def flush_index(self) -> None:
+        """인덱스 모드에서 아직 스냅샷에 쓰지 않은 추가/삭제를 저장합니다."""
+        if self.vector_index is not None:
+            self.vector_index.flush()
 
-        if existing_books["ids"]:  # 이미 존재하는 경우
-            return "이미 존재하는 책 정보입니다."
+    def _prepare_book(self, book, main_category: str, sub_category: Optional[List[str]], hashtags: Optional[List[str]]):
+        """입력값을 검증하고 (임베딩할 텍스트, 메타데이터)를 반환합니다."""
         if main_category is None or not isinstance(main_category, str):
             print(main_category)
             raise ValueError("main_category must be a non-empty string.")
@@ -36,32 +94,160 @@ class ChromaManager:
         sub_category = sub_category if sub_category is not None else []
         hashtags = hashtags if hashtags is not None else []
 
-        sub_category_str = ', '.join(sub_category)  # 리스트를 문자열로 변환
-        hashtags_str = ', '.join(hashtags)          # 리스트를 문자열로 변환
+        # 메타데이터에는 표시용 문자열과 함께 소분류별 필터 키를 저장합니다 (book_metadata.py 참고).
+        metadata = build_metadata(book, main_category, sub_category, hashtags)
 
         # 임베딩을 생성할 텍스트 조합
-        embed_text = f"title: {book.title}\nauthor: {book.author}\ndescription: {book.description}\nmain_category: {main_category}\nsub_category: {sub_category_str}\nhashtags: {hashtags_str}"
+        embed_text = f"title: {book.title}\nauthor: {book.author}\ndescription: {book.description}\nmain_category: {main_category}\nsub_category: {metadata['subCategory']}\nhashtags: {metadata['hashtags']}"
+        return embed_text, metadata
+
+    def _exists(self, isbn: str) -> bool:
+        if self.vector_index is not None:
+            return isbn in self.vector_index.rows
+        return bool(self.collection.get(ids=[isbn], include=[])["ids"])
+
+    def existing_isbns(self, isbns: List[str]) -> set:
+        """주어진 ISBN 중 이미 컬렉션에 있는 것들을 한 번의 조회로 반환합니다."""
+        if not isbns:
+            return set()
+        if self.vector_index is not None:
+            return {isbn for isbn in isbns if isbn in self.vector_index.rows}
+        return set(self.collection.get(ids=list(set(isbns)), include=[])["ids"])
+
+    def _store_books(self, books, metadatas: List[dict], embeddings) -> None:
+        # Chroma DB에 책 정보 추가 (여러 권을 한 번의 add로 저장)
+        documents = [book.description for book in books]
+        ids = [book.isbn for book in books]
+        self.collection.add(
+            documents=documents,
+            metadatas=metadatas,
+            embeddings=list(embeddings),
+            ids=ids
+        )
+        if self.vector_index is not None:
+            self.vector_index.add(ids, list(embeddings), metadatas, documents)
+
+    def _store_book(self, book, metadata: dict, embedding) -> None:
+        self._store_books([book], [metadata], [embedding])
+
+    def add_book(self, book, main_category: str, sub_category: Optional[List[str]], hashtags: Optional[List[str]]) -> str:
+        # ISBN으로 책 정보가 이미 존재하는지 확인
+        if self._exists(book.isbn):  # 이미 존재하는 경우
+            return BOOK_EXISTS_MESSAGE
+
+        embed_text, metadata = self._prepare_book(book, main_category, sub_category, hashtags)
 
         # 단일 문서에 대해 임베딩 생성
         embeddings = self.embedding_function.embed_documents([embed_text])
+        self._store_book(book, metadata, embeddings[0])
+        return BOOK_ADDED_MESSAGE
 
-        # Chroma DB에 책 정보 추가
-        self.collection.add(
-            documents=[book.description],
-            metadatas=[{
-                "title": book.title,
-                "author": book.author,
-                "isbn": book.isbn,
-                "hashtags": hashtags_str,
-                "mainCategory": main_category,
-                "subCategory": sub_category_str,
-            }],
-            embeddings=[embeddings[0]],  # 첫 번째 임베딩만 사용
-            ids=[book.isbn]
+    async def aadd_book(self, book, main_category: str, sub_category: Optional[List[str]], hashtags: Optional[List[str]]) -> str:
+        """add_book의 비동기 버전입니다. 임베딩은 비동기 클라이언트로, Chroma 작업은 스레드 풀에서 실행합니다."""
+        if await run_blocking(self._exists, book.isbn):
+            return BOOK_EXISTS_MESSAGE
+
+        embed_text, metadata = self._prepare_book(book, main_category, sub_category, hashtags)
+        embeddings = await self.embedding_function.aembed_documents([embed_text])
+        await run_blocking(self._store_book, book, metadata, embeddings[0])
+        return BOOK_ADDED_MESSAGE
+
+    async def aadd_books(self, entries) -> dict:
+        """(book, main_category, sub_category, hashtags) 목록을 한 번의 임베딩 요청과 한 번의 add로 저장합니다.
+
+        ISBN별 처리 결과 메시지를 담은 dict를 반환합니다.
+        """
+        results = {}
+        existing = await run_blocking(self.existing_isbns, [book.isbn for book, *_ in entries])
+
+        books, texts, metadatas = [], [], []
+        for book, main_category, sub_category, hashtags in entries:
+            if book.isbn in existing or book.isbn in results:
+                results[book.isbn] = BOOK_EXISTS_MESSAGE
+                continue
+            try:
+                embed_text, metadata = self._prepare_book(book, main_category, sub_category, hashtags)
+            except ValueError as e:
+                results[book.isbn] = str(e)
+                continue
+            books.append(book)
+            texts.append(embed_text)
+            metadatas.append(metadata)
+            results[book.isbn] = BOOK_ADDED_MESSAGE
+
+        if books:
+            embeddings = await self.embedding_function.aembed_documents(texts)
+            await run_blocking(self._store_books, books, metadatas, embeddings)
+        return results
+
+    def _query_similar(self, embeddings, k: int, where: Optional[dict] = None):
+        """질의 벡터마다 가까운 책 k권의 [(메타데이터, 거리), ...]를 한 번의 query로 가져옵니다."""
+        if self.vector_index is not None:
+            return [
+                [(metadata, distance) for _, metadata, _, distance in hits]
+                for hits in self.vector_index.search(embeddings, k, where=where)
+            ]
+        results = self.collection.query(
+            query_embeddings=embeddings, n_results=k, where=where, include=["metadatas", "distances"]
         )
-        return "책 정보가 성공적으로 추가되었습니다."
+        return [list(zip(metadatas, distances)) for metadatas, distances in zip(results["metadatas"], results["distances"])]
+
+    def _query_metadata(self, embedding, k: int):
+        return self._query_similar([embedding], k)[0]
+
+    def search_neighbour_metadata(self, text: str, k: int = 10):
+        """텍스트와 가까운 책 k권의 (메타데이터, 거리) 목록을 반환합니다."""
+        return self._query_metadata(self.embedding_function.embed_query(text), k)
+
+    async def asearch_neighbour_metadata(self, text: str, k: int = 10):
+        embedding = await self.embedding_function.aembed_query(text)
+        return await run_blocking(self._query_metadata, embedding, k)
+
+    def stored_embeddings(self, isbns: List[str]) -> dict:
+        """이미 저장된 책들의 {ISBN: 임베딩}을 한 번의 조회로 가져옵니다. 없는 ISBN은 빠집니다."""
+        isbns = list(dict.fromkeys(isbns))
+        if self.vector_index is not None:
+            entries = {isbn: self.vector_index.get(isbn) for isbn in isbns}
+            return {isbn: entry[2] for isbn, entry in entries.items() if entry is not None}
+        results = self.collection.get(ids=isbns, include=["embeddings"])
+        return dict(zip(results["ids"], results["embeddings"]))
+
+    def similar_books(self, isbns: List[str], k: int = 10, main_category: Optional[str] = None,
+                      sub_category: Optional[str] = None) -> dict:
+        """ISBN마다 저장된 임베딩과 가까운 책 k권을 {ISBN: [책 정보, ...]}로 반환합니다.
+
+        임베딩 API를 호출하지 않고, 요청한 모든 ISBN을 한 번의 다중 벡터 query로 검색합니다.
+        컬렉션에 없는 ISBN은 결과에서 빠집니다.
+        """
+        embeddings = self.stored_embeddings(isbns)
+        found = [isbn for isbn in dict.fromkeys(isbns) if isbn in embeddings]
+        if not found:
+            return {}
+
+        # 대분류/소분류 필터는 검색 전에 인덱스 안에서 적용됩니다.
+        where = category_where(main_category, [sub_category] if sub_category else None)
+        # 결과에 섞여 나오는 자기 자신 한 권을 빼고 k권이 남도록 한 권 더 가져옵니다.
+        neighbours = self._query_similar([embeddings[isbn] for isbn in found], k + 1, where)
+
+        results = {}
+        for isbn, candidates in zip(found, neighbours):
+            books = []
+            for metadata, distance in candidates:
+                if metadata["isbn"] == isbn:
+                    continue
+                books.append({
+                    "isbn": metadata["isbn"],
+                    "title": metadata.get("title"),
+                    "author": metadata.get("author"),
+                    "mainCategory": metadata.get("mainCategory"),
+                    "subCategory": metadata.get("subCategory"),
+                    "distance": distance,
+                })
+                if len(books) == k:
+                    break
+            results[isbn] = books
+        return results
 
-    
     def delete_book(self, isbn: str) -> str:
         # ISBN으로 책 정보가 존재하는지 확인
         existing_books = self.collection.get(ids=[isbn])
@@ -71,55 +257,242 @@ class ChromaManager:
         
         # Chroma DB에서 책 정보 삭제
         self.collection.delete(ids=[isbn])
+        if self.vector_index is not None:
+            self.vector_index.delete([isbn])
         return "책 정보가 성공적으로 삭제되었습니다."
     
-    def get_book(self, isbn: str) -> dict:
-        # ISBN으로 책 정보가 존재하는지 확인
-        existing_books = self.collection.get(ids=[isbn])
-
-        if not existing_books["ids"]:
-            raise HTTPException(status_code=404, detail="존재하지 않는 책 정보입니다.")
-
-        # 책 정보 반환
-        metadata = existing_books["metadatas"][0]  # 메타데이터 가져오기
-        return {
+    @staticmethod
+    def _book_dict(metadata: dict, document: Optional[str], fields=BOOK_FIELDS) -> dict:
+        book = {
             "title": metadata["title"],
             "author": metadata["author"],
             "isbn": metadata["isbn"],
-            "description": existing_books["documents"][0],  # 문서에서 설명 가져오기
+            "description": document,  # 문서에서 설명 가져오기
             "hashtags": metadata["hashtags"],
             "mainCategory": metadata["mainCategory"],
             "subCategory": metadata["subCategory"],
         }
-    
-    def recommend_book(self, member_id: str) -> str:
+        return {field: book[field] for field in fields}
+
+    def get_book(self, isbn: str) -> dict:
+        if self.vector_index is not None:
+            # 인덱스 모드에서는 ISBN -> 행 dict로 바로 찾습니다.
+            entry = self.vector_index.get(isbn)
+            if entry is None:
+                raise HTTPException(status_code=404, detail="존재하지 않는 책 정보입니다.")
+            metadata, document, _ = entry
+        else:
+            # ISBN으로 책 정보가 존재하는지 확인
+            existing_books = self.collection.get(ids=[isbn])
+
+            if not existing_books["ids"]:
+                raise HTTPException(status_code=404, detail="존재하지 않는 책 정보입니다.")
+            metadata = existing_books["metadatas"][0]  # 메타데이터 가져오기
+            document = existing_books["documents"][0]
+
+        # 책 정보 반환
+        return self._book_dict(metadata, document)
+
+    def get_books(self, isbns: List[str], fields: Optional[List[str]] = None) -> dict:
+        """여러 책 정보를 한 번의 조회로 {ISBN: 책 정보}로 반환합니다. 없는 ISBN은 빠집니다.
+
+        `fields`로 돌려줄 항목을 고를 수 있고, description이 없으면 문서(설명)는 읽지 않습니다.
+        """
+        fields = [field for field in BOOK_FIELDS if field in fields] if fields else list(BOOK_FIELDS)
+        isbns = list(dict.fromkeys(isbns))
+        if self.vector_index is not None:
+            entries = {isbn: self.vector_index.get(isbn) for isbn in isbns}
+            return {
+                isbn: self._book_dict(entry[0], entry[1], fields)
+                for isbn, entry in entries.items() if entry is not None
+            }
+
+        include = ["metadatas", "documents"] if "description" in fields else ["metadatas"]
+        results = self.collection.get(ids=isbns, include=include)
+        documents = results["documents"] or [None] * len(results["ids"])
+        books = {
+            isbn: self._book_dict(metadata, document, fields)
+            for isbn, metadata, document in zip(results["ids"], results["metadatas"], documents)
+        }
+        # 요청한 순서대로 반환합니다.
+        return {isbn: books[isbn] for isbn in isbns if isbn in books}
+
+    def _query_candidates(self, embeddings, n_candidates: int, where: Optional[dict] = None):
+        """질의 벡터마다 상위 후보의 (메타데이터 목록, 임베딩 목록)을 한 번의 query로 가져옵니다."""
+        if self.vector_index is not None:
+            return [
+                ([metadata for _, metadata, _, _ in hits], [embedding for _, _, embedding, _ in hits])
+                for hits in self.vector_index.search(embeddings, n_candidates, where=where)
+            ]
+        results = self.collection.query(
+            query_embeddings=embeddings, n_results=n_candidates, where=where, include=["metadatas", "embeddings"]
+        )
+        return list(zip(results["metadatas"], results["embeddings"]))
+
+    def _query_preferred_candidates(self, embeddings, preference_sets, n_candidates: int):
+        """선호 소분류 목록마다 그 소분류에 속한 책 안에서 후보를 찾습니다.
+
+        where 필터는 query 한 번에 하나만 줄 수 있으므로 선호 조합마다 따로 검색합니다.
+        걸러진 후보가 `n_candidates`보다 적은 조합은 필터 없는 검색 결과로 채우며,
+        필터가 없는 조합과 채우기용 검색은 각각 한 번의 다중 벡터 query로 처리합니다.
+        """
+        if not RECOMMEND_FILTER_BY_PREFERENCE:
+            return self._query_candidates(embeddings, n_candidates)
+
+        results = [([], [])] * len(embeddings)
+        wheres = [category_where(sub_categories=preferences) for preferences in preference_sets]
+        for row, where in enumerate(wheres):
+            if where is not None:
+                results[row] = self._query_candidates([embeddings[row]], n_candidates, where)[0]
+
+        short = [row for row, (metadatas, _) in enumerate(results) if len(metadatas) < n_candidates]
+        if short:
+            extra = self._query_candidates([embeddings[row] for row in short], n_candidates)
+            for row, (extra_metadatas, extra_embeddings) in zip(short, extra):
+                metadatas, candidate_embeddings = list(results[row][0]), list(results[row][1])
+                seen = {metadata["isbn"] for metadata in metadatas}
+                for metadata, embedding in zip(extra_metadatas, extra_embeddings):
+                    if len(metadatas) >= n_candidates:
+                        break
+                    if metadata["isbn"] not in seen:
+                        seen.add(metadata["isbn"])
+                        metadatas.append(metadata)
+                        candidate_embeddings.append(embedding)
+                results[row] = (metadatas, candidate_embeddings)
+        return results
+
+    @staticmethod
+    def _rank_candidates(query_embedding, metadatas, candidate_embeddings) -> list:
+        """후보를 MMR로 다시 정렬해 서로 비슷한 책이 연달아 나오지 않게 합니다."""
+        order = mmr(query_embedding, candidate_embeddings, lambda_mult=RECOMMEND_MMR_LAMBDA)
+        return [metadatas[index] for index in order]
+
+    @staticmethod
+    def _pick_for_member(member_id, ranked, book_ids: dict, excluded: set, recommendation_date) -> list:
+        """이미 추천한 책을 뺀 순위 목록을 반환합니다.
+
+        선호가 같은 회원끼리도 서로 다른 책을 받도록 상위 몇 권 안에서 회원/날짜별로 시작 위치를 돌립니다.
+        """
+        available = [
+            {"isbn": metadata["isbn"], "book_id": book_ids[metadata["isbn"]], "title": metadata.get("title")}
+            for metadata in ranked
+            if book_ids.get(metadata["isbn"]) and book_ids[metadata["isbn"]] not in excluded
+        ]
+        window = min(RECOMMEND_ROTATION_WINDOW, len(available))
+        if window > 1:
+            offset = zlib.crc32(f"{member_id}:{recommendation_date}".encode()) % window
+            available = available[offset:window] + available[:offset] + available[window:]
+        return available
+
+    def recommend_book(self, member_id: str) -> dict:
+        """회원에게 추천할 책 순위 목록을 만들고, 1순위 책을 다음 날 추천으로 저장합니다."""
         preferences = get_member_preferences(member_id)
         if not preferences:
-            return "No preferences found for the member."
+            return {"message": "No preferences found for the member.", "recommendations": []}
 
-        query = " ".join(preferences)
-        embedding = self.embedding_function.embed_query(query)
+        # 선호가 바뀌지 않았다면 저장된 선호 벡터를 그대로 사용합니다.
+        vectors, _ = self.preference_store.vectors_for({member_id: preferences})
+        embedding = vectors[member_id]
 
-        results = self.collection.query(query_embeddings=embedding, n_results=1)
-        
-        if results['documents'] and results['metadatas']:
-            # 메타데이터에서 ISBN 가져오기
-            metadata = results['metadatas'][0][0]  # 이중 리스트에서 첫 번째 메타데이터 가져오기
-            isbn = metadata['isbn']
-            
-            # ISBN으로 MySQL에서 book_id를 검색합니다.
-            book_id = get_book_id_by_isbn(isbn)  # 새로운 함수 추가 필요
-            if not book_id:
-                return "No book ID found for the given ISBN."
-            
-            recommendation_date = (datetime.now() + timedelta(days=1)).date()
-            
-            # MySQL에 book_id를 저장합니다.
-            save_recommendation(member_id, book_id, recommendation_date)
-            
-            return f"Recommended book ID: {book_id}"
-        else:
-            return "No book found for the given preferences."
+        metadatas, candidate_embeddings = self._query_preferred_candidates([embedding], [preferences], RECOMMEND_CANDIDATES)[0]
+        if not metadatas:
+            return {"message": "No book found for the given preferences.", "recommendations": []}
+
+        # ISBN으로 MySQL에서 book_id를 한 번에 검색하고, 이미 추천한 책은 제외합니다.
+        book_ids = get_book_ids_by_isbns([metadata["isbn"] for metadata in metadatas])
+        recommendation_date = (datetime.now() + timedelta(days=1)).date()
+        excluded = get_recommended_book_ids([member_id], since=_exclusion_start(recommendation_date)).get(member_id, set())
+        ranked = self._rank_candidates(embedding, metadatas, candidate_embeddings)
+        recommendations = self._pick_for_member(member_id, ranked, book_ids, excluded, recommendation_date)
+        if not recommendations:
+            return {"message": "No new book found for the given preferences.", "recommendations": []}
+
+        book_id = recommendations[0]["book_id"]
+        # MySQL에 book_id를 저장합니다.
+        save_recommendation(member_id, book_id, recommendation_date)
+
+        return {"message": f"Recommended book ID: {book_id}", "recommendations": recommendations[:RECOMMEND_RESULTS]}
+
+    def recommend_books_for_all_members(self, batch_size: int = 100, shard: Optional[tuple] = None) -> dict:
+        """모든 회원의 추천 도서를 배치로 계산해 저장하고, 처리 건수와 단계별 소요 시간(초)을 반환합니다.
 
+        `shard`를 (번호, 전체 수)로 주면 그 샤드에 속한 회원만 처리해 여러 워커가 나눠서 실행할 수 있습니다.
+        """
+        timings = {"load_preferences": 0.0, "refresh_vectors": 0.0, "query": 0.0, "resolve_book_ids": 0.0, "rank": 0.0, "save": 0.0}
 
+        started = time.perf_counter()
+        member_preferences = get_all_member_preferences()
+        if shard is not None:
+            member_preferences = {
+                member_id: preferences for member_id, preferences in member_preferences.items()
+                if in_shard(member_id, shard)
+            }
+        # 추천 이력은 실행마다 한 번만 읽어서 메모리의 집합으로 비교합니다.
+        recommended = get_recommended_book_ids(
+            list(member_preferences) if shard is not None else None,
+            since=_exclusion_start((datetime.now() + timedelta(days=1)).date()),
+        )
+        timings["load_preferences"] = time.perf_counter() - started
+
+        # 선호가 바뀐 회원의 벡터만 다시 계산하고 나머지는 저장된 벡터를 사용합니다.
+        started = time.perf_counter()
+        vectors, vector_stats = self.preference_store.vectors_for(member_preferences)
+        # 조회에 실패하면 빈 dict가 오므로, 그대로 정리하면 저장된 벡터가 모두 지워집니다.
+        if member_preferences:
+            self.preference_store.prune(
+                member_preferences, owns=(lambda member_id: in_shard(member_id, shard)) if shard is not None else None
+            )
+        timings["refresh_vectors"] = time.perf_counter() - started
+
+        # 선호 카테고리 조합이 같은 회원끼리 묶어서 조합마다 한 번만 검색합니다.
+        groups = {}
+        for member_id, preferences in member_preferences.items():
+            groups.setdefault(tuple(sorted(set(preferences))), []).append(member_id)
+        query_embeddings = [vectors[member_ids[0]] for member_ids in groups.values()]
+        preference_sets = list(groups)
+
+        candidates = []
+        for offset in range(0, len(query_embeddings), batch_size):
+            started = time.perf_counter()
+            candidates.extend(self._query_preferred_candidates(
+                query_embeddings[offset:offset + batch_size], preference_sets[offset:offset + batch_size], RECOMMEND_CANDIDATES
+            ))
+            timings["query"] += time.perf_counter() - started
+            print(f"Recommendation progress: {len(candidates)}/{len(query_embeddings)} preference groups")
+
+        started = time.perf_counter()
+        book_ids = get_book_ids_by_isbns(
+            [metadata["isbn"] for metadatas, _ in candidates for metadata in metadatas]
+        )
+        timings["resolve_book_ids"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        recommendation_date = (datetime.now() + timedelta(days=1)).date()
+        recommendations = []
+        exhausted = 0
+        for member_ids, embedding, (metadatas, candidate_embeddings) in zip(groups.values(), query_embeddings, candidates):
+            if not metadatas:
+                continue
+            ranked = self._rank_candidates(embedding, metadatas, candidate_embeddings)
+            for member_id in member_ids:
+                picked = self._pick_for_member(
+                    member_id, ranked, book_ids, recommended.get(member_id, set()), recommendation_date
+                )
+                if picked:
+                    recommendations.append((member_id, picked[0]["book_id"], recommendation_date))
+                else:
+                    exhausted += 1
+        timings["rank"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        save_recommendations(recommendations)
+        timings["save"] = time.perf_counter() - started
 
+        return {
+            "members": len(member_preferences),
+            "preference_groups": len(groups),
+            "saved": len(recommendations),
+            "exhausted": exhausted,  # 후보를 모두 이미 추천받은 회원 수
+            "preference_vectors": vector_stats,
+            "timings": timings,
+        }
@@ -0,0 +1,90 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from blocking import run_blocking
+from category_classifier import set_neighbour_search
+from outbound import get_upstream
+
+load_dotenv()
+
+# 프로세스 안에서 하나씩만 만드는 무거운 클라이언트들의 등록소입니다.
+# chromadb, langchain_openai, openai는 처음 사용할 때 import해서 시작 시간과 워커별 메모리를 줄입니다.
+CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+CHROMA_COLLECTION_NAME = os.getenv("CHROMA_COLLECTION_NAME", "books")
+
+_lock = threading.Lock()
+_chroma_manager = None
+_openai_client = None
+_chat_models = {}
+
+
+def get_chroma_manager():
+    """프로세스에 하나뿐인 ChromaManager를 반환합니다. 처음 호출할 때 벡터 저장소를 엽니다."""
+    global _chroma_manager
+    if _chroma_manager is None:
+        with _lock:
+            if _chroma_manager is None:
+                from chroma_manager import ChromaManager
+
+                os.makedirs(CHROMA_PERSIST_DIRECTORY, exist_ok=True)
+                _chroma_manager = ChromaManager(persist_directory=CHROMA_PERSIST_DIRECTORY, collection_name=CHROMA_COLLECTION_NAME)
+    return _chroma_manager
+
+
+async def aget_chroma_manager():
+    """get_chroma_manager의 비동기 버전입니다. 처음 여는 동안 이벤트 루프를 막지 않도록 스레드 풀에서 만듭니다."""
+    if _chroma_manager is not None:
+        return _chroma_manager
+    return await run_blocking(get_chroma_manager)
+
+
+def get_openai_client():
+    """공유 AsyncOpenAI 클라이언트를 반환합니다."""
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                from openai import AsyncOpenAI
+
+                # 재시도와 제한 시간은 outbound.py의 "openai" 정책이 맡습니다.
+                _openai_client = AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"), timeout=get_upstream("openai").timeout, max_retries=0
+                )
+    return _openai_client
+
+
+def get_chat_model(model_name: str = "gpt-4"):
+    """모델 이름별로 하나씩 만든 ChatOpenAI 클라이언트를 반환합니다."""
+    model = _chat_models.get(model_name)
+    if model is None:
+        with _lock:
+            model = _chat_models.get(model_name)
+            if model is None:
+                from langchain_openai import ChatOpenAI
+
+                model = _chat_models[model_name] = ChatOpenAI(
+                    model_name=model_name, timeout=get_upstream("openai").timeout, max_retries=0
+                )
+    return model
+
+
+def close_clients():
+    """만들어진 클라이언트만 정리합니다 (인덱스 모드의 미저장 변경 기록 등)."""
+    if _chroma_manager is not None:
+        _chroma_manager.flush_index()
+
+
+def _search_neighbour_metadata(text, k):
+    return get_chroma_manager().search_neighbour_metadata(text, k)
+
+
+async def _asearch_neighbour_metadata(text, k):
+    # 처음 여는 경우에도 이벤트 루프를 막지 않도록 비동기 버전으로 가져옵니다.
+    chroma_manager = await aget_chroma_manager()
+    return await chroma_manager.asearch_neighbour_metadata(text, k)
+
+
+# 분류기의 kNN 단계는 처음 필요할 때 공유 ChromaManager를 엽니다.
+set_neighbour_search(_search_neighbour_metadata, _asearch_neighbour_metadata)
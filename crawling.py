@@ -1,39 +1,123 @@
-import requests
-from bs4 import BeautifulSoup
+import os
+import re
 
-# 도서 검색 결과 페이지에서 해시태그 정보 가져오기
-def get_hashtags(isbn):
-    standard_category = load_categories(file_path="categories.txt")
-    search_url = f"https://search.kyobobook.co.kr/search?keyword={isbn}"
-    
-    try:
-        # 페이지 요청
-        response = requests.get(search_url)
+from selectolax.lexbor import LexborHTMLParser
+
+from category_registry import standard_categories
+from http_client import get_async_client, get_session
+from outbound import get_upstream
+from response_cache import ResponseCache
+
+SEARCH_URL = "https://search.kyobobook.co.kr/search?keyword={isbn}"
+
+# 교보문고 검색 페이지 호출 정책 (속도 제한, 제한 시간, 재시도, 서킷 브레이커)
+kyobo = get_upstream("kyobo")
+
+# 마지막 해시태그 링크 뒤로 이만큼(바이트) 더 읽어도 새 링크가 없으면 나머지 페이지는 받지 않습니다.
+KYOBO_TAG_BLOCK_TAIL = int(os.getenv("KYOBO_TAG_BLOCK_TAIL", 4096))
+KYOBO_CHUNK_SIZE = int(os.getenv("KYOBO_CHUNK_SIZE", 16 * 1024))
+
+# class 속성에 'tag'가 들어 있는 링크의 시작 (정확한 'a.tag' 선택은 파서가 다시 합니다)
+_TAG_LINK = re.compile(rb"""<a\s[^>]*class=["'][^"']*(?<![\w-])tag(?![\w-])""")
+# 청크 경계에 걸친 링크 시작 태그를 놓치지 않도록 이만큼 앞에서부터 다시 찾습니다.
+_TAG_LINK_OVERLAP = 1024
+
+
+class _TagBlockReader:
+    """페이지를 조각(bytes)으로 받으면서 해시태그 링크가 모인 구간만 찾아 둡니다."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pos = 0
+        self._start = None  # 첫 해시태그 링크의 시작 위치
+        self._end = None  # 마지막 해시태그 링크('</a>')가 끝나는 위치
+
+    def feed(self, chunk) -> bool:
+        """조각을 추가하고, 해시태그 구간을 다 읽었으면 True를 반환합니다."""
+        self._buffer += chunk
+        while True:
+            match = _TAG_LINK.search(self._buffer, self._pos)
+            if match is None:
+                break
+            close = self._buffer.find(b"</a>", match.end())
+            if close == -1:
+                break  # 링크가 다음 조각에서 끝나면 그때 다시 찾습니다.
+            if self._start is None:
+                self._start = match.start()
+            self._end = self._pos = close + 4
+        self._pos = max(self._pos, len(self._buffer) - _TAG_LINK_OVERLAP)
+        return self._end is not None and len(self._buffer) - self._end >= KYOBO_TAG_BLOCK_TAIL
+
+    def fragment(self) -> str:
+        if self._start is None:
+            return ""
+        return self._buffer[self._start:self._end].decode("utf-8", errors="replace")
+
+
+# 해시태그 구간 HTML에서 표준 카테고리를 제외한 해시태그 추출
+def _parse_hashtags(fragment):
+    if not fragment:
+        return []
+    # 페이지 전체 대신 해시태그 구간만 C로 구현된 lexbor 파서로 파싱
+    hashtags_elements = LexborHTMLParser(fragment).css('a.tag')  # CSS 선택자로 해시태그 요소 찾기
+    hashtags = [tag.text().replace("#", "") for tag in hashtags_elements]
+    hashtags = list(dict.fromkeys(hashtags))  # 중복 제거
+
+    # 표준 카테고리에 포함된 해시태그 제거 (공백, '/' 표기 차이는 무시)
+    return [tag for tag in hashtags if tag not in standard_categories]
+
+# 검색 결과 페이지 전체 HTML에서 해시태그 추출
+def _extract_hashtags(html):
+    reader = _TagBlockReader()
+    reader.feed(html.encode("utf-8") if isinstance(html, str) else html)
+    return _parse_hashtags(reader.fragment())
+
+# 교보문고 해시태그 캐시 (해시태그가 없는 ISBN은 더 짧게 보관)
+hashtags_cache = ResponseCache(
+    "kyobo_hashtags",
+    ttl=float(os.getenv("KYOBO_CACHE_TTL", 24 * 60 * 60)),
+    negative_ttl=float(os.getenv("KYOBO_NEGATIVE_CACHE_TTL", 60 * 60)),
+)
+
+def _get_tag_block(isbn):
+    # 페이지를 조각으로 받다가 해시태그 구간을 다 읽으면 나머지는 받지 않습니다.
+    reader = _TagBlockReader()
+    with get_session().get(SEARCH_URL.format(isbn=isbn), timeout=kyobo.timeout, stream=True) as response:
         response.raise_for_status()  # 요청이 실패하면 예외 발생
+        for chunk in response.iter_content(KYOBO_CHUNK_SIZE):
+            if reader.feed(chunk):
+                break
+    return reader.fragment()
 
-        # BeautifulSoup으로 HTML 파싱
-        soup = BeautifulSoup(response.text, 'html.parser')
+async def _aget_tag_block(isbn):
+    reader = _TagBlockReader()
+    async with get_async_client().stream("GET", SEARCH_URL.format(isbn=isbn), timeout=kyobo.timeout) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes(KYOBO_CHUNK_SIZE):
+            if reader.feed(chunk):
+                break
+    return reader.fragment()
 
-        # 해시태그 리스트 추출
-        hashtags_elements = soup.select('a.tag')  # CSS 선택자로 해시태그 요소 찾기
-        hashtags = [tag.text.replace("#", "") for tag in hashtags_elements]
-        hashtags = list(set(hashtags))  # 중복 제거
+def _fetch_hashtags(isbn):
+    return _parse_hashtags(kyobo.call(_get_tag_block, isbn)) or None
 
-        # 표준 카테고리에 포함된 해시태그 제거
-        hashtags = [tag for tag in hashtags if tag not in standard_category]
+async def _afetch_hashtags(isbn):
+    return _parse_hashtags(await kyobo.acall(_aget_tag_block, isbn)) or None
 
-        return hashtags
+# 도서 검색 결과 페이지에서 해시태그 정보 가져오기
+def get_hashtags(isbn):
+    try:
+        return hashtags_cache.get_or_fetch(isbn, lambda: _fetch_hashtags(isbn)) or []
     
     except Exception as e:
         print(f"해시태그를 찾는 중 오류 발생: {e}")
         return None
 
-# 카테고리 파일에서 카테고리 리스트 가져오기
-def load_categories(file_path):
+# 이벤트 루프를 막지 않는 비동기 버전
+async def aget_hashtags(isbn):
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            categories = [line.strip() for line in file.readlines()]
-        return categories
+        return await hashtags_cache.aget_or_fetch(isbn, lambda: _afetch_hashtags(isbn)) or []
+
     except Exception as e:
-        print(f"카테고리 파일을 읽는 중 오류 발생: {e}")
-        return []
+        print(f"해시태그를 찾는 중 오류 발생: {e}")
+        return None
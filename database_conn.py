@@ -1,74 +1,85 @@
-import pymysql
 from dotenv import load_dotenv
-from sshtunnel import SSHTunnelForwarder
-import os
 import ast
+import os
+import threading
+
+from db_pool import get_connection
 
 load_dotenv()
 
-def connect_to_db():
-    """SSH 터널을 통해 MySQL 데이터베이스에 연결하고 연결 객체를 반환합니다."""
-    ssh_tunnel_host_address = os.environ['SSH_TUNNEL_HOST_ADDRESS']
-    ssh_tunnel_host_port = int(os.environ['SSH_TUNNEL_HOST_PORT'])
-    ssh_username = os.environ['SSH_USERNAME']
-    ssh_private_key = os.environ['SSH_PRIVATE_KEY']
-    mysql_server_host = os.environ['MYSQL_SERVER_HOST']
-    db_username = os.environ['DB_USERNAME']
-    db_password = os.environ['DB_PASSWORD']
-    db_database_name = os.environ['DB_DATABASE_NAME'] 
+# `IN (...)` 조회 한 번에 넣는 최대 값 개수
+DB_IN_CHUNK_SIZE = int(os.getenv("DB_IN_CHUNK_SIZE", 1000))
+
+# 서브 카테고리 이름 -> ID. 시작 시 한 번 읽고, 모르는 이름이 나오면 한 번 더 읽습니다.
+_sub_category_ids = None
+_sub_category_lock = threading.Lock()
+
+def _select_in(cursor, sql, values, params=()):
+    """`{placeholders}` 자리에 값 목록을 나눠 넣어 `IN (...)` 조회를 실행하고 모든 행을 반환합니다.
+
+    `params`는 `IN (...)` 앞에 오는 다른 자리 표시자의 값으로, 조회마다 앞에 붙습니다.
+    """
+    values = list(dict.fromkeys(values))
+    rows = []
+    for offset in range(0, len(values), DB_IN_CHUNK_SIZE):
+        chunk = values[offset:offset + DB_IN_CHUNK_SIZE]
+        cursor.execute(sql.format(placeholders=", ".join(["%s"] * len(chunk))), [*params, *chunk])
+        rows.extend(cursor.fetchall())
+    return rows
 
+def load_sub_category_ids(cursor=None):
+    """`sub_categories` 전체를 읽어 이름 -> ID 캐시를 (다시) 채웁니다."""
+    global _sub_category_ids
+    sql = "SELECT sub_category_id, sub_category_name FROM sub_categories"
     try:
-        tunnel = SSHTunnelForwarder(
-            (ssh_tunnel_host_address, ssh_tunnel_host_port),  # SSH 서버 주소 및 IP
-            ssh_username=ssh_username,          # SSH 사용자 이름
-            ssh_pkey=ssh_private_key,           # SSH 개인 키 파일 경로
-            remote_bind_address=(mysql_server_host, 3306)  # MySQL 서버 주소 및 포트
-        )
-        tunnel.start()  # SSH 터널 시작
-
-        # MySQL 연결
-        connection = pymysql.connect(
-            host='127.0.0.1',  # 로컬 호스트
-            user=db_username,  # MySQL 사용자 이름
-            password=db_password,  # MySQL 비밀번호
-            db=db_database_name,  # 사용할 데이터베이스 이름
-            charset='utf8mb4',
-            port=tunnel.local_bind_port,  # SSH 터널로 로컬 포트 바인딩
-            cursorclass=pymysql.cursors.DictCursor
-        )
-
-        return connection, tunnel  # 연결 객체와 터널 반환
+        if cursor is None:
+            with get_connection() as connection, connection.cursor() as cursor:
+                cursor.execute(sql)
+                rows = cursor.fetchall()
+        else:
+            cursor.execute(sql)
+            rows = cursor.fetchall()
     except Exception as e:
-        print(f"Error connecting to the database: {e}")
+        print(f"Error loading sub_categories: {e}")
+        return _sub_category_ids or {}
+    with _sub_category_lock:
+        _sub_category_ids = {row['sub_category_name']: row['sub_category_id'] for row in rows}
+    print(f"Loaded {len(_sub_category_ids)} sub_categories")
+    return _sub_category_ids
+
+def get_sub_category_ids(names, cursor=None):
+    """서브 카테고리 이름 목록의 {이름: ID}를 캐시에서 찾습니다. 없는 이름은 결과에서 빠집니다."""
+    ids = _sub_category_ids
+    names = list(names)
+    if ids is None or any(name not in ids for name in names):
+        ids = load_sub_category_ids(cursor)
+    return {name: ids[name] for name in names if name in ids}
 
 def get_sub_category_id(connection, category_name):
     """주어진 카테고리 이름에 대한 서브 카테고리 ID를 조회합니다."""
-    try:
-        with connection.cursor() as cursor:
-            sql = "SELECT sub_category_id FROM sub_categories WHERE sub_category_name = %s"
-            cursor.execute(sql, (category_name,))
-            result = cursor.fetchone()
-            if result:
-                return result['sub_category_id']
-            else:
-                return None
-    except Exception as e:
-        print(f"Error finding sub_category_id: {e}")
-        return None
+    with connection.cursor() as cursor:
+        return get_sub_category_ids([category_name], cursor).get(category_name)
 
 def insert_book_info_to_db(book, category_names, hashtags):
-    """책 정보를 데이터베이스에 삽입합니다."""
-    connection, tunnel = connect_to_db()  # 연결 생성
-    if not connection:
-        print("Failed to connect to the database.")
-        return
-      
-    if isinstance(category_names, str):
-        category_names = ast.literal_eval(category_names) 
+    """책 정보를 데이터베이스에 삽입합니다. 성공하면 True, 실패해서 롤백되면 False를 반환합니다."""
+    return insert_books_info_to_db([(book, category_names, hashtags)])
+
+def insert_books_info_to_db(entries):
+    """(book, category_names, hashtags) 목록을 하나의 트랜잭션으로 데이터베이스에 삽입합니다.
+
+    테이블마다 여러 행 INSERT 한 번과 ID를 찾는 `IN (...)` 조회 한 번으로 처리하므로,
+    책 수와 관계없이 왕복 횟수가 일정합니다. 성공하면 True, 실패해서 롤백되면 False를 반환합니다.
+    """
+    entries = [
+        (book, ast.literal_eval(category_names) if isinstance(category_names, str) else category_names, hashtags or [])
+        for book, category_names, hashtags in entries
+    ]
+    if not entries:
+        return True
 
     try:
-        with connection.cursor() as cursor:
-            # 1. `books` 테이블에 책 정보를 삽입
+        with get_connection() as connection, connection.cursor() as cursor:
+            # 1. `books` 테이블에 책 정보를 삽입 (executemany가 여러 행을 하나의 INSERT로 묶어서 전송)
             sql_book = """
                 INSERT INTO books (isbn, title, author, description, publisher, cover_url, publish_year)
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
@@ -76,7 +87,7 @@ def insert_book_info_to_db(book, category_names, hashtags):
                 title = VALUES(title), author = VALUES(author), description = VALUES(description),
                 publisher = VALUES(publisher), cover_url = VALUES(cover_url), publish_year = VALUES(publish_year)
             """
-            cursor.execute(sql_book, (
+            cursor.executemany(sql_book, [(
                 book.isbn,
                 book.title,
                 book.author,
@@ -84,57 +95,75 @@ def insert_book_info_to_db(book, category_names, hashtags):
                 book.publisher,
                 book.cover_url,
                 book.publish_year
-            ))
+            ) for book, _, _ in entries])
 
-            # 삽입된 책의 ID를 가져오기
-            book_id = cursor.lastrowid
+            # 삽입된 책의 ID를 ISBN으로 한 번에 조회 (이미 있던 책은 lastrowid로 알 수 없음)
+            rows = _select_in(
+                cursor, "SELECT isbn, book_id FROM books WHERE isbn IN ({placeholders})",
+                [book.isbn for book, _, _ in entries]
+            )
+            book_ids = {row['isbn']: row['book_id'] for row in rows}
 
-            # 2. `hashtags` 테이블에 해시태그 삽입
-            for hashtag in hashtags:
+            # 2. `hashtags` 테이블에 해시태그를 한 번에 삽입하고, ID도 이름으로 한 번에 조회
+            names = list(dict.fromkeys(hashtag for _, _, hashtags in entries for hashtag in hashtags))
+            hashtag_ids, folded = {}, {}
+            if names:
                 sql_hashtag = """
                     INSERT INTO hashtags (name) VALUES (%s)
-                    ON DUPLICATE KEY UPDATE name = VALUES(name)
+                    ON DUPLICATE KEY UPDATE name = name
                 """
-                cursor.execute(sql_hashtag, (hashtag,))
-                hashtag_id = cursor.lastrowid
+                cursor.executemany(sql_hashtag, [(name,) for name in names])
+                rows = _select_in(cursor, "SELECT hashtag_id, name FROM hashtags WHERE name IN ({placeholders})", names)
+                hashtag_ids = {row['name']: row['hashtag_id'] for row in rows}
+                # 대소문자를 구분하지 않는 콜레이션에서는 저장된 이름의 대소문자가 다를 수 있습니다.
+                folded = {name.casefold(): hashtag_id for name, hashtag_id in hashtag_ids.items()}
 
-                # 3. `book_hashtag_mappings` 테이블에 book_id와 hashtag_id 매핑
+            # 3. `book_hashtag_mappings` 테이블에 book_id와 hashtag_id 매핑
+            hashtag_mappings = {
+                (book_ids[book.isbn], hashtag_ids.get(hashtag) or folded[hashtag.casefold()])
+                for book, _, hashtags in entries for hashtag in hashtags
+            }
+            if hashtag_mappings:
                 sql_book_hashtag_mapping = """
                     INSERT INTO book_hashtag_mappings (book_id, hashtag_id)
                     VALUES (%s, %s)
                     ON DUPLICATE KEY UPDATE book_id = VALUES(book_id), hashtag_id = VALUES(hashtag_id)
                 """
-                cursor.execute(sql_book_hashtag_mapping, (book_id, hashtag_id))
-
-            # 4. `sub_category_id` 조회 및 `book_sub_category_mappings` 테이블에 book_id와 sub_category_id 매핑
-            for category_name in category_names:
-                sub_category_id = get_sub_category_id(connection, category_name)  # 변경된 부분
-                if sub_category_id:
-                    sql_book_sub_category_mapping = """
-                        INSERT INTO book_sub_category_mappings (book_id, sub_category_id)
-                        VALUES (%s, %s)
-                        ON DUPLICATE KEY UPDATE book_id = VALUES(book_id), sub_category_id = VALUES(sub_category_id)
-                    """
-                    cursor.execute(sql_book_sub_category_mapping, (book_id, sub_category_id))
-                else:
-                    print(f"Sub-category not found for category: {category_name}")
+                cursor.executemany(sql_book_hashtag_mapping, sorted(hashtag_mappings))
+
+            # 4. 캐시된 `sub_category_id`로 `book_sub_category_mappings` 테이블에 book_id와 sub_category_id 매핑
+            sub_category_ids = get_sub_category_ids(
+                {name for _, category_names, _ in entries for name in category_names}, cursor
+            )
+            sub_category_mappings = set()
+            for book, category_names, _ in entries:
+                for category_name in category_names:
+                    if category_name in sub_category_ids:
+                        sub_category_mappings.add((book_ids[book.isbn], sub_category_ids[category_name]))
+                    else:
+                        print(f"Sub-category not found for category: {category_name}")
+            if sub_category_mappings:
+                sql_book_sub_category_mapping = """
+                    INSERT INTO book_sub_category_mappings (book_id, sub_category_id)
+                    VALUES (%s, %s)
+                    ON DUPLICATE KEY UPDATE book_id = VALUES(book_id), sub_category_id = VALUES(sub_category_id)
+                """
+                cursor.executemany(sql_book_sub_category_mapping, sorted(sub_category_mappings))
 
             # 모든 작업이 성공했으면 커밋
             connection.commit()
-            print("Transaction committed successfully")
+            print(f"Transaction committed successfully ({len(entries)} books)")
+            return True
 
     except Exception as e:
+        # 커밋되지 않은 작업은 연결이 풀로 반납될 때 롤백됩니다.
         print(f"Error occurred, rolling back. Error: {e}")
-        connection.rollback()
-    finally:
-        connection.close()  # 연결 종료
-        tunnel.close()  # 터널 종료
+        return False
 
 def get_member_preferences(member_id):
     """사용자의 선호 서브 카테고리 ID 리스트를 반환합니다."""
-    connection, tunnel = connect_to_db()
     try:
-        with connection.cursor() as cursor:
+        with get_connection() as connection, connection.cursor() as cursor:
             sql = """
                 SELECT sc.sub_category_name
                 FROM member_sub_category_selections ms
@@ -147,17 +176,10 @@ def get_member_preferences(member_id):
             return [row['sub_category_name'] for row in results]
     except Exception as e:
         print(f"Error occurred, Error: {e}")
-    finally:
-        connection.close()
-        tunnel.close()
 
 def get_book_id_by_isbn(isbn: str) -> int:
-    connection, tunnel = connect_to_db()  # 연결 생성
-    if not connection:
-        print("Failed to connect to the database.")
-        return
     try:
-        with connection.cursor() as cursor:
+        with get_connection() as connection, connection.cursor() as cursor:
             cursor.execute("SELECT book_id FROM books WHERE isbn = %s", (isbn,))
             result = cursor.fetchone()
             if result:
@@ -166,69 +188,125 @@ def get_book_id_by_isbn(isbn: str) -> int:
                 return None  # 책이 없는 경우
     except Exception as e:
         print(f"Error occurred, Error: {e}")
-    finally:
-        connection.close()
-        tunnel.close()
-
-    return result[0] if result else None
 
 
 def save_recommendation(member_id, book_id, recommendation_date):
     """추천된 책 정보를 daily_book_id_recommendations 테이블에 저장합니다."""
-    connection, tunnel = connect_to_db()
-    try:
-        with connection.cursor() as cursor:
-            sql = """
-            INSERT INTO daily_book_id_recommendations (member_id, book_id, recommendation_date)
-            VALUES (%s, %s, %s)
-            """
-            cursor.execute(sql, (member_id, book_id, recommendation_date))
-            connection.commit()
-    finally:
-        connection.close()
-        tunnel.close()
+    with get_connection() as connection, connection.cursor() as cursor:
+        sql = """
+        INSERT INTO daily_book_id_recommendations (member_id, book_id, recommendation_date)
+        VALUES (%s, %s, %s)
+        """
+        cursor.execute(sql, (member_id, book_id, recommendation_date))
+        connection.commit()
         
 def insert_best_sellers(best_sellers):
-    connection, tunnel = connect_to_db()  # DB 연결 생성
-    if not connection:
-        print("데이터베이스 연결에 실패했습니다.")
-        return  # 연결 실패 시 종료
+    """베스트셀러 목록을 한 트랜잭션 안에서 지우고 다시 채웁니다.
 
+    커밋 전까지 다른 연결은 InnoDB 스냅샷으로 이전 목록을 읽으므로, 조회하는 쪽에 빈 테이블은 보이지 않습니다.
+    """
+    if not best_sellers:
+        print("베스트셀러 목록이 비어 있어 기존 데이터를 유지합니다.")
+        return False
     try:
-        with connection.cursor() as cursor:
+        with get_connection() as connection, connection.cursor() as cursor:
             # 기존 베스트셀러 데이터 삭제
-            sql_delete = "DELETE FROM monthly_best_sellers"
-            cursor.execute(sql_delete)  # 쿼리 실행
+            cursor.execute("DELETE FROM monthly_best_sellers")
 
-            # 삽입할 쿼리 템플릿
+            # 각 베스트셀러의 ISBN과 순위를 한 번에 삽입
             sql_insert = "INSERT INTO monthly_best_sellers (book_isbn, book_rank) VALUES (%s, %s)"
-
-            # 각 베스트셀러에 대해 ISBN과 순위를 DB에 삽입
-            for best_seller in best_sellers:
-                isbn = best_seller['isbn']
-                rank = best_seller['best_rank']
-                cursor.execute(sql_insert, (isbn, rank))  # 쿼리 실행
-            
-            connection.commit()  # 변경 사항 커밋
+            cursor.executemany(sql_insert, [(best_seller['isbn'], best_seller['best_rank']) for best_seller in best_sellers])
+            connection.commit()  # 삭제와 삽입을 한 번에 커밋
             print("베스트셀러 데이터가 성공적으로 삽입되었습니다.")
+            return True
 
     except Exception as e:
+        # 커밋 전에 실패하면 연결을 반납할 때 롤백되어 기존 목록이 그대로 남습니다.
         print(f"데이터 삽입 중 오류 발생: {e}")
-        connection.rollback()  # 오류 발생 시 롤백
-    finally:
-        connection.close()  # 연결 종료
+        return False
 
 def get_all_member_ids():
     """모든 회원 ID를 반환합니다."""
-    connection, tunnel = connect_to_db()
     try:
-        with connection.cursor() as cursor:
+        with get_connection() as connection, connection.cursor() as cursor:
             cursor.execute("SELECT member_id FROM members")
             results = cursor.fetchall()
             return [row['member_id'] for row in results]
     except Exception as e:
         print(f"Error occurred, Error: {e}")
         return []
-    finally:
-        connection.close()
-        tunnel.close()
+
+def get_all_member_preferences():
+    """모든 회원의 선호 서브 카테고리 이름을 한 번의 조인으로 조회해 {member_id: [이름, ...]} 형태로 반환합니다."""
+    try:
+        with get_connection() as connection, connection.cursor() as cursor:
+            sql = """
+                SELECT ms.member_id, sc.sub_category_name
+                FROM member_sub_category_selections ms
+                JOIN sub_categories sc ON ms.sub_category_id = sc.sub_category_id
+                """
+            cursor.execute(sql)
+            preferences = {}
+            for row in cursor.fetchall():
+                preferences.setdefault(row['member_id'], []).append(row['sub_category_name'])
+            return preferences
+    except Exception as e:
+        print(f"Error occurred, Error: {e}")
+        return {}
+
+def get_book_ids_by_isbns(isbns):
+    """여러 ISBN의 book_id를 한 번의 `IN (...)` 조회로 가져와 {isbn: book_id} 형태로 반환합니다."""
+    isbns = list(set(isbns))
+    if not isbns:
+        return {}
+    try:
+        with get_connection() as connection, connection.cursor() as cursor:
+            rows = _select_in(cursor, "SELECT isbn, book_id FROM books WHERE isbn IN ({placeholders})", isbns)
+            return {row['isbn']: row['book_id'] for row in rows}
+    except Exception as e:
+        print(f"Error occurred, Error: {e}")
+        return {}
+
+def save_recommendations(recommendations):
+    """(member_id, book_id, recommendation_date) 목록을 executemany로 한 번에 저장합니다."""
+    if not recommendations:
+        return
+    with get_connection() as connection, connection.cursor() as cursor:
+        sql = """
+        INSERT INTO daily_book_id_recommendations (member_id, book_id, recommendation_date)
+        VALUES (%s, %s, %s)
+        """
+        cursor.executemany(sql, recommendations)
+        connection.commit()
+
+def get_recommended_book_ids(member_ids=None, since=None):
+    """회원별로 이미 추천한 book_id 집합을 {member_id: set(book_id)} 형태로 한 번에 조회합니다.
+
+    `member_ids`를 주지 않으면 모든 회원의 추천 이력을 가져오고,
+    `since`(날짜)를 주면 그날 이후의 추천만 가져옵니다.
+    """
+    try:
+        with get_connection() as connection, connection.cursor() as cursor:
+            sql = "SELECT member_id, book_id FROM daily_book_id_recommendations"
+            conditions, params = [], []
+            if since is not None:
+                conditions.append("recommendation_date >= %s")
+                params.append(since)
+            if member_ids is not None:
+                if not member_ids:
+                    return {}
+                conditions.append("member_id IN ({placeholders})")
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            if member_ids is not None:
+                rows = _select_in(cursor, sql, member_ids, params)
+            else:
+                cursor.execute(sql, params or None)
+                rows = cursor.fetchall()
+            recommended = {}
+            for row in rows:
+                recommended.setdefault(row['member_id'], set()).add(row['book_id'])
+            return recommended
+    except Exception as e:
+        print(f"Error occurred, Error: {e}")
+        return {}
@@ -0,0 +1,212 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import pymysql
+from dotenv import load_dotenv
+from pymysql.constants import CR, SERVER_STATUS
+
+load_dotenv()
+
+# 연결이 이 시간(초) 이상 놀고 있었다면 꺼내기 전에 ping으로 상태를 확인합니다.
+DEFAULT_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DEFAULT_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", 30))
+DEFAULT_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", 30))
+# 터널 너머로 닿지 못했을 때의 오류 코드. 인증 실패 등 다른 오류로는 터널을 다시 열지 않습니다.
+TUNNEL_ERROR_CODES = {CR.CR_CONN_HOST_ERROR, CR.CR_SERVER_LOST}
+
+
+class ConnectionPool:
+    """프로세스 전체에서 공유하는 SSH 터널과 MySQL 연결 풀입니다.
+
+    API와 스케줄러가 같은 터널 하나를 재사용하고, 연결은 최대 `max_size`개까지만 만듭니다.
+    """
+
+    def __init__(self, max_size=DEFAULT_POOL_SIZE, checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT,
+                 ping_interval=DEFAULT_PING_INTERVAL):
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+
+        self._idle = queue.LifoQueue()  # (connection, 반납 시각)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._tunnel = None
+        self._tunnel_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "hits": 0,            # 놀고 있던 연결을 재사용한 횟수
+            "misses": 0,          # 새 연결을 만든 횟수
+            "reconnects": 0,      # 상태 확인 실패 후 다시 연결한 횟수
+            "tunnel_starts": 0,
+            "discarded": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    def _count(self, key, value=1):
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def _ensure_tunnel(self):
+        """터널이 없거나 끊어졌다면 새로 엽니다."""
+        with self._tunnel_lock:
+            if self._tunnel is not None and self._tunnel.is_active:
+                return self._tunnel
+
+            if self._tunnel is not None:
+                try:
+                    self._tunnel.close()
+                except Exception as e:
+                    print(f"Error closing stale SSH tunnel: {e}")
+
+            # sshtunnel은 paramiko까지 불러오므로 처음 연결할 때 import합니다.
+            from sshtunnel import SSHTunnelForwarder
+
+            tunnel = SSHTunnelForwarder(
+                (os.environ['SSH_TUNNEL_HOST_ADDRESS'], int(os.environ['SSH_TUNNEL_HOST_PORT'])),  # SSH 서버 주소 및 IP
+                ssh_username=os.environ['SSH_USERNAME'],          # SSH 사용자 이름
+                ssh_pkey=os.environ['SSH_PRIVATE_KEY'],           # SSH 개인 키 파일 경로
+                remote_bind_address=(os.environ['MYSQL_SERVER_HOST'], 3306)  # MySQL 서버 주소 및 포트
+            )
+            tunnel.start()  # SSH 터널 시작
+            self._tunnel = tunnel
+            self._count("tunnel_starts")
+            return tunnel
+
+    def _connect(self):
+        """터널을 통해 새 MySQL 연결을 만듭니다. 첫 시도가 실패하면 터널을 다시 열고 한 번 더 시도합니다."""
+        for attempt in range(2):
+            tunnel = self._ensure_tunnel()
+            try:
+                return pymysql.connect(
+                    host='127.0.0.1',  # 로컬 호스트
+                    user=os.environ['DB_USERNAME'],  # MySQL 사용자 이름
+                    password=os.environ['DB_PASSWORD'],  # MySQL 비밀번호
+                    db=os.environ['DB_DATABASE_NAME'],  # 사용할 데이터베이스 이름
+                    charset='utf8mb4',
+                    port=tunnel.local_bind_port,  # SSH 터널로 로컬 포트 바인딩
+                    cursorclass=pymysql.cursors.DictCursor
+                )
+            except pymysql.err.OperationalError as e:
+                if attempt or (tunnel.is_active and e.args[0] not in TUNNEL_ERROR_CODES):
+                    raise
+                self._reset_tunnel()
+                self._count("reconnects")
+
+    def _reset_tunnel(self):
+        with self._tunnel_lock:
+            if self._tunnel is not None:
+                try:
+                    self._tunnel.close()
+                except Exception as e:
+                    print(f"Error closing SSH tunnel: {e}")
+                self._tunnel = None
+
+    def _discard(self, connection):
+        self._count("discarded")
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _checkout(self):
+        """놀고 있는 연결을 꺼내 상태를 확인하고, 없으면 새로 만듭니다."""
+        while True:
+            try:
+                connection, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                self._count("misses")
+                return self._connect()
+
+            if time.monotonic() - returned_at < self.ping_interval:
+                self._count("hits")
+                return connection
+            try:
+                connection.ping(reconnect=False)
+                self._count("hits")
+                return connection
+            except Exception:
+                # 끊어진 연결은 버리고 다음 연결(또는 새 연결)로 넘어갑니다.
+                self._discard(connection)
+                self._count("reconnects")
+
+    def _checkin(self, connection):
+        # 읽기만 한 연결도 트랜잭션 스냅샷이 남지 않도록 정리한 뒤 반납합니다.
+        if connection.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            connection.rollback()
+        self._idle.put((connection, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """풀에서 연결을 빌려주고, 블록이 끝나면 반납합니다.
+
+        블록 안에서 연결 오류가 나면 해당 연결은 풀에 돌려놓지 않고 버립니다.
+        """
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            self._count("timeouts")
+            raise TimeoutError("Timed out waiting for a database connection.")
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+
+        connection = None
+        try:
+            connection = self._checkout()
+            yield connection
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            if connection is not None:
+                self._discard(connection)
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                try:
+                    self._checkin(connection)
+                except Exception:
+                    self._discard(connection)
+            self._slots.release()
+
+    def close(self):
+        """놀고 있는 연결과 터널을 모두 닫습니다."""
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+        self._reset_tunnel()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["wait_time_avg"] = stats["wait_time_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        stats["idle"] = self._idle.qsize()
+        stats["max_size"] = self.max_size
+        stats["tunnel_active"] = bool(self._tunnel is not None and self._tunnel.is_active)
+        return stats
+
+
+# API와 스케줄러가 함께 사용하는 프로세스 전역 풀
+pool = ConnectionPool()
+
+
+def get_connection():
+    """`with get_connection() as connection:` 형태로 풀에서 연결을 빌립니다."""
+    return pool.connection()
+
+
+def close_pool():
+    pool.close()
+
+
+def pool_stats() -> dict:
+    return pool.stats()
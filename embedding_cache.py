@@ -0,0 +1,182 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from dotenv import load_dotenv
+
+from blocking import run_blocking
+
+load_dotenv()
+
+DEFAULT_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+DEFAULT_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", 4096))
+DEFAULT_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200000))
+
+
+def normalize_text(text: str) -> str:
+    """유니코드 정규화 후 연속 공백을 하나로 합칩니다."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """(모델 이름 + 정규화된 텍스트) 해시를 키로 임베딩 벡터를 저장하는 캐시입니다.
+
+    메모리 LRU를 먼저 보고, 없으면 로컬 SQLite 파일을 조회합니다.
+    메모리에는 벡터를 float32 배열로 보관해 파이썬 리스트보다 훨씬 적은 메모리를 씁니다 (1536차원 기준 약 6KB).
+    디스크 항목 수가 `max_entries`를 넘으면 가장 오래 쓰이지 않은 항목부터 지웁니다.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, memory_size=DEFAULT_MEMORY_SIZE, max_entries=DEFAULT_MAX_ENTRIES):
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._db.commit()
+        self._disk_count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys):
+        """키 목록에 대한 벡터(float32 배열) 목록을 반환합니다. 캐시에 없는 항목은 None입니다."""
+        vectors = [None] * len(keys)
+        with self._lock:
+            disk_lookup = {}
+            for index, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    vectors[index] = vector
+                else:
+                    disk_lookup.setdefault(key, []).append(index)
+
+            if disk_lookup:
+                placeholders = ", ".join(["?"] * len(disk_lookup))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", list(disk_lookup)
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    for index in disk_lookup[key]:
+                        vectors[index] = vector
+                    self._stats["disk_hits"] += len(disk_lookup[key])
+                if rows:
+                    self._db.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(time.time(), key) for key, _ in rows]
+                    )
+                    self._db.commit()
+                self._stats["misses"] += sum(1 for vector in vectors if vector is None)
+        return vectors
+
+    def put_many(self, model, keys, vectors):
+        now = time.time()
+        with self._lock:
+            rows = []
+            for key, vector in zip(keys, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, model, vector.tobytes(), now))
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)", rows)
+            self._disk_count += self._db.total_changes - before
+            if self._disk_count > self.max_entries:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        overflow = self._disk_count - self.max_entries
+        self._db.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (overflow,)
+        )
+        self._disk_count -= overflow
+        self._stats["evictions"] += overflow
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = self._disk_count
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+class CachedEmbeddings:
+    """LangChain 임베딩 객체를 감싸서 이미 계산한 텍스트는 API를 호출하지 않도록 합니다."""
+
+    def __init__(self, embeddings, cache: EmbeddingCache, upstream=None):
+        self.embeddings = embeddings
+        self.cache = cache
+        # 주어지면 캐시에 없는 텍스트의 임베딩 요청을 이 호출 정책(outbound.Upstream)으로 보냅니다.
+        self.upstream = upstream
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+
+    def _lookup(self, texts):
+        """캐시 조회 결과와, 캐시에 없는 텍스트를 중복 없이 모은 {키: 텍스트}를 반환합니다."""
+        keys = [cache_key(self.model, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+        return keys, vectors, missing
+
+    def _merge(self, keys, vectors, missing, computed):
+        if missing:
+            self.cache.put_many(self.model, list(missing), computed)
+        computed_by_key = dict(zip(missing, computed))
+        # 호출하는 쪽(Chroma, LangChain)은 리스트를 기대하므로 캐시의 배열은 반환할 때만 리스트로 바꿉니다.
+        return [
+            computed_by_key[key] if vector is None else vector.tolist() for key, vector in zip(keys, vectors)
+        ]
+
+    def embed_documents(self, texts):
+        # 캐시에 없는 텍스트만 한 번에 임베딩합니다.
+        keys, vectors, missing = self._lookup(texts)
+        if not missing:
+            return self._merge(keys, vectors, missing, [])
+        texts = list(missing.values())
+        if self.upstream is None:
+            computed = self.embeddings.embed_documents(texts)
+        else:
+            computed = self.upstream.call(self.embeddings.embed_documents, texts)
+        return self._merge(keys, vectors, missing, computed)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        # 캐시의 SQLite 조회/기록은 이벤트 루프를 막지 않도록 스레드 풀에서 실행합니다.
+        keys, vectors, missing = await run_blocking(self._lookup, texts)
+        if not missing:
+            return self._merge(keys, vectors, missing, [])
+        texts = list(missing.values())
+        if self.upstream is None:
+            computed = await self.embeddings.aembed_documents(texts)
+        else:
+            computed = await self.upstream.acall(self.embeddings.aembed_documents, texts)
+        return await run_blocking(self._merge, keys, vectors, missing, computed)
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from clients import get_openai_client
+from outbound import get_upstream
+from response_cache import ResponseCache
+
+load_dotenv()
+
+# temperature 0 요청은 같은 입력에 같은 답을 내므로 이 시간(초) 동안 재사용합니다. 0이면 캐시하지 않습니다.
+GENERATE_CACHE_TTL = float(os.getenv("GENERATE_CACHE_TTL", 24 * 60 * 60))
+
+generation_cache = ResponseCache("generate", ttl=GENERATE_CACHE_TTL, negative_ttl=0)
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "streams": 0, "streams_completed": 0, "streams_aborted": 0, "stream_cache_hits": 0}
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _cacheable(temperature):
+    return GENERATE_CACHE_TTL > 0 and temperature == 0
+
+
+def _cache_key(prompt, model, max_tokens):
+    raw = json.dumps([model, max_tokens, prompt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _create(prompt, model, max_tokens, temperature, stream=False):
+    # OpenAI 호출 정책 (속도 제한, 제한 시간, 재시도, 서킷 브레이커)을 거쳐 요청합니다.
+    options = {} if temperature is None else {"temperature": temperature}
+    return get_upstream("openai").acall(
+        get_openai_client().chat.completions.create,
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+        stream=stream,
+        **options
+    )
+
+
+async def generate(prompt, model, max_tokens, temperature=None):
+    """응답 전체를 받아서 텍스트로 반환합니다."""
+    _count("requests")
+
+    async def fetch():
+        response = await _create(prompt, model, max_tokens, temperature)
+        # API 응답에서 텍스트 부분 추출
+        return response.choices[0].message.content
+
+    if not _cacheable(temperature):
+        return await fetch()
+    return await generation_cache.aget_or_fetch(_cache_key(prompt, model, max_tokens), fetch)
+
+
+async def stream_generate(prompt, model, max_tokens, temperature=None):
+    """생성되는 대로 텍스트 조각을 내보내는 비동기 제너레이터입니다.
+
+    클라이언트가 연결을 끊어 제너레이터가 취소되거나 닫히면 OpenAI 스트림도 바로 닫아 남은 토큰을 생성하지 않습니다.
+    """
+    _count("streams")
+    key = _cache_key(prompt, model, max_tokens) if _cacheable(temperature) else None
+    if key is not None:
+        cached = await generation_cache.aget(key)
+        if cached is not None:
+            _count("stream_cache_hits")
+            _count("streams_completed")
+            yield cached
+            return
+
+    stream = await _create(prompt, model, max_tokens, temperature, stream=True)
+    parts = []
+    completed = False
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+        completed = True
+    finally:
+        if not completed:
+            _count("streams_aborted")
+            # 연결이 끊겨 취소된 경우에도 OpenAI 스트림 정리는 끝까지 하도록 보호합니다.
+            await asyncio.shield(stream.close())
+    _count("streams_completed")
+    if key is not None:
+        await generation_cache.aset(key, "".join(parts))
+
+
+def _sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def sse_events(deltas):
+    """텍스트 조각을 server-sent events 형식으로 바꿉니다. 끝나면 done, 실패하면 error 이벤트를 보냅니다."""
+    try:
+        async for delta in deltas:
+            yield _sse({"delta": delta})
+    except Exception as e:
+        yield _sse({"detail": str(e)}, event="error")
+        return
+    yield _sse({}, event="done")
+
+
+def generation_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["cache"] = generation_cache.stats()
+    return stats
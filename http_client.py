@@ -0,0 +1,51 @@
+import os
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# 알라딘/교보문고 요청에 공통으로 쓰는 비동기 HTTP 클라이언트 설정
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 50))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+# 응답을 압축해서 받아 전송량을 줄입니다 (httpx/requests가 자동으로 풀어 줍니다).
+HTTP_HEADERS = {"Accept-Encoding": "gzip, deflate"}
+
+_client = None
+_session = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """연결 풀을 공유하는 프로세스 전역 httpx.AsyncClient를 반환합니다."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            follow_redirects=True,
+            headers=HTTP_HEADERS,
+        )
+    return _client
+
+
+def get_session() -> requests.Session:
+    """동기 요청에 쓰는, 호스트별 연결을 재사용하는 프로세스 전역 requests.Session을 반환합니다."""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS, pool_maxsize=HTTP_MAX_CONNECTIONS)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(HTTP_HEADERS)
+        _session = session
+    return _session
+
+
+async def close_async_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
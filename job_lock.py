@@ -0,0 +1,168 @@
+import fcntl
+import functools
+import json
+import os
+import socket
+import time
+from datetime import datetime
+
+from blocking import run_blocking
+from db_pool import get_connection
+
+# 예약 작업 실행권을 어디에 기록할지: mysql(여러 호스트), file(한 호스트), none(항상 실행)
+JOB_LOCK_BACKEND = os.getenv("JOB_LOCK_BACKEND", "mysql")
+JOB_LOCK_PATH = os.getenv("JOB_LOCK_PATH", "./job_runs.json")
+# 실행권을 가진 워커가 이 시간(초) 안에 끝내지 못하면 죽은 것으로 보고 다른 워커가 가져갈 수 있습니다.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 6 * 60 * 60))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class MySQLJobLock:
+    """`scheduler_job_runs` 테이블의 (작업 이름, 실행 키) 기본 키로 실행권을 한 워커에게만 줍니다."""
+
+    def __init__(self):
+        self._table_ready = False
+
+    def _ensure_table(self, cursor):
+        if self._table_ready:
+            return
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scheduler_job_runs (
+                job_name VARCHAR(100) NOT NULL,
+                run_key VARCHAR(100) NOT NULL,
+                worker VARCHAR(255) NOT NULL,
+                lease_until DATETIME NOT NULL,
+                finished_at DATETIME NULL,
+                PRIMARY KEY (job_name, run_key)
+            )
+        """)
+        self._table_ready = True
+
+    def claim(self, job_name, run_key) -> bool:
+        with get_connection() as connection, connection.cursor() as cursor:
+            self._ensure_table(cursor)
+            # 처음이면 삽입(1), 끝나지 않은 채 임대 시간이 지난 실행이면 넘겨받고(2), 그 외에는 바뀌지 않습니다(0).
+            cursor.execute("""
+                INSERT INTO scheduler_job_runs (job_name, run_key, worker, lease_until)
+                VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND)
+                ON DUPLICATE KEY UPDATE
+                worker = IF(finished_at IS NULL AND lease_until < NOW(), VALUES(worker), worker),
+                lease_until = IF(finished_at IS NULL AND lease_until < NOW(), VALUES(lease_until), lease_until)
+            """, (job_name, run_key, WORKER_ID, int(JOB_LEASE_SECONDS)))
+            connection.commit()
+            return cursor.rowcount in (1, 2)
+
+    def finish(self, job_name, run_key, succeeded):
+        with get_connection() as connection, connection.cursor() as cursor:
+            if succeeded:
+                cursor.execute(
+                    "UPDATE scheduler_job_runs SET finished_at = NOW() WHERE job_name = %s AND run_key = %s AND worker = %s",
+                    (job_name, run_key, WORKER_ID)
+                )
+            else:
+                # 실패한 실행은 지워서 다음 실행(다른 워커 포함)이 다시 시도할 수 있게 합니다.
+                cursor.execute(
+                    "DELETE FROM scheduler_job_runs WHERE job_name = %s AND run_key = %s AND worker = %s",
+                    (job_name, run_key, WORKER_ID)
+                )
+            connection.commit()
+
+
+class FileJobLock:
+    """한 호스트의 여러 워커가 파일 잠금(flock) 아래에서 JSON 파일에 실행 기록을 남깁니다."""
+
+    def __init__(self, path=JOB_LOCK_PATH):
+        self.path = path
+
+    def _update(self, change):
+        with open(self.path + ".lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.path, 'r', encoding='utf-8') as file:
+                    runs = json.load(file)
+            except (FileNotFoundError, ValueError):
+                runs = {}
+            result = change(runs)
+            tmp = self.path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as file:
+                json.dump(runs, file)
+            os.replace(tmp, self.path)
+            return result
+
+    def claim(self, job_name, run_key) -> bool:
+        key = f"{job_name}|{run_key}"
+
+        def change(runs):
+            run = runs.get(key)
+            if run is not None and (run["finished"] or run["lease_until"] >= time.time()):
+                return False
+            runs[key] = {"worker": WORKER_ID, "lease_until": time.time() + JOB_LEASE_SECONDS, "finished": False}
+            return True
+
+        return self._update(change)
+
+    def finish(self, job_name, run_key, succeeded):
+        key = f"{job_name}|{run_key}"
+
+        def change(runs):
+            run = runs.get(key)
+            if run is None or run["worker"] != WORKER_ID:
+                return
+            if succeeded:
+                run["finished"] = True
+            else:
+                del runs[key]
+
+        self._update(change)
+
+
+class NoJobLock:
+    """잠금 없이 항상 실행합니다 (단일 프로세스 개발 환경용)."""
+
+    def claim(self, job_name, run_key) -> bool:
+        return True
+
+    def finish(self, job_name, run_key, succeeded):
+        pass
+
+
+_backends = {"mysql": MySQLJobLock, "file": FileJobLock, "none": NoJobLock}
+job_lock = _backends[JOB_LOCK_BACKEND]()
+
+
+async def run_claimed(job_name, run_key, func, *args, **kwargs):
+    """(작업 이름, 실행 키)의 실행권을 얻은 경우에만 `func`를 실행하고 (실행 여부, 결과)를 반환합니다.
+
+    워커나 컨테이너가 여러 개여도 같은 실행 키의 작업은 한 곳에서만 실행됩니다.
+    """
+    try:
+        claimed = await run_blocking(job_lock.claim, job_name, run_key)
+    except Exception as e:
+        print(f"작업 실행권 확인 중 오류 발생 ({job_name} {run_key}): {e}")
+        return False, None
+    if not claimed:
+        print(f"다른 워커가 이미 실행했거나 실행 중입니다: {job_name} {run_key}")
+        return False, None
+
+    succeeded = False
+    try:
+        result = await func(*args, **kwargs)
+        succeeded = True
+        return True, result
+    finally:
+        try:
+            await run_blocking(job_lock.finish, job_name, run_key, succeeded)
+        except Exception as e:
+            print(f"작업 실행 기록 중 오류 발생 ({job_name} {run_key}): {e}")
+
+
+def run_once(job_name, period_format):
+    """비동기 예약 작업을 `period_format`(strftime 형식) 기간마다 전체 워커 중 한 번만 실행하도록 감쌉니다."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            _, result = await run_claimed(job_name, datetime.now().strftime(period_format), func, *args, **kwargs)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,168 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "./job_queue.sqlite3")
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+# 실패 후 다시 시도하기까지 기다리는 시간(초). 시도할 때마다 두 배로 늘어납니다.
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", 30))
+# 워커가 이 시간(초) 동안 진행 상황을 알리지 않으면 죽은 것으로 보고 다른 워커가 다시 가져갑니다.
+JOB_QUEUE_LEASE_SECONDS = float(os.getenv("JOB_QUEUE_LEASE_SECONDS", 15 * 60))
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+class PermanentJobError(Exception):
+    """다시 시도해도 성공할 수 없는 실패 (찾을 수 없는 ISBN 등)입니다."""
+
+
+class JobQueue:
+    """여러 프로세스가 함께 쓰는 SQLite 기반 작업 큐입니다.
+
+    API는 작업을 넣고 ID를 바로 돌려주며, 워커 프로세스들이 `claim`으로 하나씩 가져가 처리합니다.
+    가져가는 작업은 `BEGIN IMMEDIATE` 트랜잭션 안에서 골라서 두 워커가 같은 작업을 받지 않습니다.
+    `progress`/`complete`/`fail`은 `claim`이 돌려준 작업을 받아, 그 시도(워커, 시도 횟수)가 아직
+    작업을 쥐고 있을 때만 기록합니다. 임대 시간이 지나 다른 시도가 가져간 작업은 덮어쓰지 않습니다.
+    """
+
+    # claim한 시도가 아직 작업을 쥐고 있는지 확인하는 조건
+    _LEASE_CONDITION = "id = ? AND status = 'running' AND worker = ? AND attempts = ?"
+
+    def __init__(self, path=JOB_QUEUE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._db()
+
+    def _db(self):
+        """스레드마다 별도의 SQLite 연결을 씁니다."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+                "progress TEXT, result TEXT, error TEXT, worker TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, available_at REAL NOT NULL, locked_until REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status_available_at ON jobs (status, available_at)")
+            self._local.db = db
+        return db
+
+    def enqueue(self, kind, payload, max_attempts=JOB_MAX_ATTEMPTS) -> str:
+        """작업을 넣고 작업 ID를 반환합니다."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._db().execute(
+            "INSERT INTO jobs (id, kind, payload, status, max_attempts, created_at, updated_at, available_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload, ensure_ascii=False), max_attempts, now, now, now)
+        )
+        return job_id
+
+    def claim(self, worker):
+        """처리할 작업 하나를 가져와 실행 중으로 표시하고 반환합니다. 없으면 None을 반환합니다.
+
+        대기 중인 작업과, 실행 중이지만 임대 시간이 지난(워커가 죽은) 작업이 대상입니다.
+        """
+        db = self._db()
+        while True:
+            now = time.time()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT * FROM jobs WHERE (status = 'queued' AND available_at <= ?) "
+                    "OR (status = 'running' AND locked_until < ?) ORDER BY available_at LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is None:
+                    db.execute("COMMIT")
+                    return None
+                if row["attempts"] >= row["max_attempts"]:
+                    # 마지막 시도 중에 워커가 죽은 작업은 더 시도하지 않습니다.
+                    db.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                        ("worker lease expired", now, row["id"])
+                    )
+                    db.execute("COMMIT")
+                    continue
+                db.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, "
+                    "updated_at = ?, locked_until = ? WHERE id = ?",
+                    (worker, now, now + JOB_QUEUE_LEASE_SECONDS, row["id"])
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            job = self._decode(row)
+            job.update(status="running", attempts=row["attempts"] + 1, worker=worker)
+            return job
+
+    @staticmethod
+    def _lease(job):
+        return job["id"], job["worker"], job["attempts"]
+
+    def _update_leased(self, job, assignments, values) -> bool:
+        cursor = self._db().execute(
+            f"UPDATE jobs SET {assignments} WHERE {self._LEASE_CONDITION}", (*values, *self._lease(job))
+        )
+        if cursor.rowcount == 0:
+            print(f"Job {job['id']} attempt {job['attempts']} no longer holds the lease; update ignored")
+            return False
+        return True
+
+    def progress(self, job, progress: dict) -> bool:
+        """진행 상황을 기록하고 임대 시간을 연장합니다."""
+        now = time.time()
+        return self._update_leased(
+            job, "progress = ?, updated_at = ?, locked_until = ?",
+            (json.dumps(progress, ensure_ascii=False), now, now + JOB_QUEUE_LEASE_SECONDS)
+        )
+
+    def complete(self, job, result) -> bool:
+        return self._update_leased(
+            job, "status = 'done', result = ?, error = NULL, updated_at = ?, locked_until = NULL",
+            (json.dumps(result, ensure_ascii=False), time.time())
+        )
+
+    def fail(self, job, error: str, retry: bool = True) -> bool:
+        """실패를 기록합니다. 시도 횟수가 남았고 `retry`이면 지수적으로 늘어나는 대기 후 다시 대기열에 넣습니다."""
+        now = time.time()
+        if retry and job["attempts"] < job["max_attempts"]:
+            available_at = now + JOB_RETRY_DELAY * 2 ** (job["attempts"] - 1)
+            return self._update_leased(
+                job, "status = 'queued', error = ?, updated_at = ?, available_at = ?, locked_until = NULL",
+                (error, now, available_at)
+            )
+        return self._update_leased(
+            job, "status = 'failed', error = ?, updated_at = ?, locked_until = NULL", (error, now)
+        )
+
+    @staticmethod
+    def _decode(row) -> dict:
+        job = dict(row)
+        for key in ("payload", "progress", "result"):
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+    def get(self, job_id):
+        """작업 상태를 dict로 반환합니다. 없으면 None을 반환합니다."""
+        row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._decode(row) if row is not None else None
+
+    def stats(self) -> dict:
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        for status, count in self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[status] = count
+        return counts
@@ -0,0 +1,153 @@
+"""작업 큐(job_queue.py)에 쌓인 도서 등록/분류 작업을 처리하는 워커 프로세스입니다.
+
+사용 예:
+    python job_worker.py --processes 2 --concurrency 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+
+from fastapi import HTTPException
+
+import book_tasks
+from blocking import run_blocking, shutdown_executor
+from bulk_ingest import BULK_BATCH_SIZE, ingest_isbns, summarize
+from clients import aget_chroma_manager, close_clients
+from db_pool import close_pool
+from http_client import close_async_client
+from job_queue import JobQueue, PermanentJobError
+from pipeline import PipelineError
+
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", 1))
+# 프로세스 하나가 동시에 처리하는 작업 수
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", 4))
+# 대기 중인 작업이 없을 때 큐를 다시 확인하는 간격(초)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1.0))
+
+
+async def _add_book(chroma_manager, queue, job):
+    isbn = job["payload"]["isbn"]
+    try:
+        message, timings = await book_tasks.add_book(chroma_manager, isbn)
+    except PipelineError as e:
+        # 찾을 수 없는 책처럼 요청 자체가 잘못된 경우는 다시 시도하지 않습니다.
+        if isinstance(e.error, HTTPException) and e.error.status_code < 500:
+            raise PermanentJobError(e.error.detail)
+        raise
+    return {"message": message, "timings": timings}
+
+
+async def _add_books(chroma_manager, queue, job):
+    payload = job["payload"]
+
+    async def on_progress(done, total, summary):
+        # SQLite 쓰기가 이벤트 루프를 막지 않도록 스레드 풀에서 기록합니다.
+        await run_blocking(queue.progress, job, {"done": done, "total": total, "summary": summary})
+
+    results = await ingest_isbns(
+        chroma_manager, payload["isbns"], batch_size=payload.get("batch_size", BULK_BATCH_SIZE), on_progress=on_progress
+    )
+    return {"results": results, "summary": summarize(results)}
+
+
+async def _classify(chroma_manager, queue, job):
+    payload = job["payload"]
+    result = await book_tasks.classify_book(payload["title"], payload["author"], payload["isbn"], payload["description"])
+    if result["main_category"] is None:
+        raise RuntimeError("classification failed")
+    return result
+
+
+# 작업 종류 -> 처리 함수
+HANDLERS = {
+    "add_book": _add_book,
+    "add_books": _add_books,
+    "classify": _classify,
+}
+
+
+async def _run_job(chroma_manager, queue, job):
+    handler = HANDLERS.get(job["kind"])
+    try:
+        if handler is None:
+            raise PermanentJobError(f"unknown job kind: {job['kind']}")
+        result = await handler(chroma_manager, queue, job)
+    except PermanentJobError as e:
+        print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+        await run_blocking(queue.fail, job, str(e), False)
+    except Exception as e:
+        print(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']}/{job['max_attempts']} failed: {e}")
+        await run_blocking(queue.fail, job, str(e))
+    else:
+        await run_blocking(queue.complete, job, result)
+
+
+async def work(concurrency=JOB_WORKER_CONCURRENCY, poll_interval=JOB_POLL_INTERVAL):
+    """큐에서 작업을 가져와 최대 `concurrency`개까지 동시에 처리합니다."""
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue()
+    chroma_manager = await aget_chroma_manager()
+    print(f"Job worker {worker} started (concurrency={concurrency})")
+
+    running = set()
+    try:
+        while True:
+            while len(running) < concurrency:
+                job = await run_blocking(queue.claim, worker)
+                if job is None:
+                    break
+                running.add(asyncio.create_task(_run_job(chroma_manager, queue, job)))
+            if running:
+                done, _ = await asyncio.wait(running, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+                running -= done
+            else:
+                await asyncio.sleep(poll_interval)
+    finally:
+        # 처리 중이던 작업은 임대 시간이 지나면 다른 워커가 다시 가져갑니다.
+        for task in running:
+            task.cancel()
+        close_clients()
+        await close_async_client()
+
+
+def _process_main(concurrency, poll_interval):
+    try:
+        asyncio.run(work(concurrency, poll_interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_executor()
+        close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=JOB_WORKER_PROCESSES)
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY)
+    parser.add_argument("--poll-interval", type=float, default=JOB_POLL_INTERVAL)
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        _process_main(args.concurrency, args.poll_interval)
+        return
+
+    # 부모가 import 시점에 연 SQLite 연결(응답 캐시 등)을 자식이 물려받지 않도록 fork 대신 spawn으로 시작합니다.
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_process_main, args=(args.concurrency, args.poll_interval))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
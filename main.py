@@ -1,50 +1,64 @@
 import asyncio
+import hashlib
+import json
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-import openai
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
-import chromadb
-import os
-
-from book_info import get_book_info_by_isbn 
-from chroma_manager import ChromaManager
-from category_classifier import classify_category
-from crawling import get_hashtags
+from blocking import run_blocking, shutdown_executor
+import book_tasks
+from book_info import book_info_cache
+from bulk_ingest import BULK_BATCH_SIZE, BULK_MAX_BATCH_SIZE, ingest_isbns, summarize
+from chroma_manager import BOOK_FIELDS, SIMILAR_BOOKS_MAX_K
+from clients import aget_chroma_manager, close_clients
+from category_classifier import classification_cache, classifier_stats
+from crawling import aget_hashtags, hashtags_cache
+from generation import generate, generation_stats, sse_events, stream_generate
+from http_client import close_async_client
+from job_queue import JobQueue
+from outbound import outbound_stats
+from pipeline import PipelineError
 from scheduler import start_scheduler
-from database_conn import insert_book_info_to_db
+from database_conn import load_sub_category_ids
+from db_pool import close_pool, pool_stats
 
 # .env 파일에서 환경 변수 로드
 load_dotenv()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # 서브 카테고리 이름 -> ID 캐시를 미리 채워 도서 저장 시 조회하지 않도록 합니다.
+    await run_blocking(load_sub_category_ids)
     print("Starting scheduler...")
     start_scheduler()
     print("Scheduler started.")
     yield
     print("Stopping scheduler...")
+    # 인덱스 모드에서 저장하지 않은 변경을 스냅샷에 기록
+    close_clients()
+    # 공유 HTTP 클라이언트, 스레드 풀, DB 연결 풀과 SSH 터널 종료
+    await close_async_client()
+    shutdown_executor()
+    close_pool()
 
 app = FastAPI(lifespan=lifespan)
 
-# OpenAI API Key 설정
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-# Chroma DB 설정
-persist_directory = "./chroma_db"
-chroma_manager = ChromaManager(persist_directory=persist_directory, collection_name="books")
+# 비동기 작업 모드: 요청은 작업 큐에 넣고 바로 작업 ID를 반환하며, job_worker.py 프로세스가 처리합니다.
+job_queue = JobQueue()
 
-# 디렉토리가 없으면 생성
-if not os.path.exists(persist_directory):
-    os.makedirs(persist_directory)
-    
 
 # 요청 본문을 처리하기 위한 Pydantic 모델
 class GenerateMessageRequest(BaseModel):
     prompt: str
     model: str = "gpt-4"
     max_tokens: int = 100
+    # 0이면 같은 요청의 응답을 캐시에서 재사용합니다 (None이면 모델 기본값).
+    temperature: Optional[float] = None
+    # True면 생성되는 토큰을 server-sent events로 바로 보냅니다.
+    stream: bool = False
 
 class ClassifyMessageRequest(BaseModel):
     title: str
@@ -59,6 +73,10 @@ class CrawlMessageRequest(BaseModel):
 class AddBookRequest(BaseModel):
     isbn: str
 
+class AddBooksRequest(BaseModel):
+    isbns: List[str]
+    batch_size: int = Field(BULK_BATCH_SIZE, gt=0, le=BULK_MAX_BATCH_SIZE)
+
 class BookRequest(BaseModel):
     title: str
     author: str
@@ -71,19 +89,27 @@ class BookRequest(BaseModel):
 class RecommendRequest(BaseModel):
     member_id: int
 
+class SimilarBooksRequest(BaseModel):
+    isbns: List[str]
+    k: int = Field(10, ge=1, le=SIMILAR_BOOKS_MAX_K)
+    mainCategory: Optional[str] = None
+    subCategory: Optional[str] = None
+
 
 # 기본 엔드포인트
 @app.post("/generate")
 async def generate_text(request: GenerateMessageRequest):
+    if request.stream:
+        # 첫 토큰부터 바로 보냅니다. 클라이언트가 연결을 끊으면 스트림이 취소되어 생성도 멈춥니다.
+        deltas = stream_generate(request.prompt, request.model, request.max_tokens, request.temperature)
+        return StreamingResponse(
+            sse_events(deltas),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     try:
         # OpenAI API 호출
-        response = openai.ChatCompletion.create(
-            model=request.model,
-            messages=[{"role": "user", "content": request.prompt}],
-            max_tokens=request.max_tokens
-        )
-        # API 응답에서 텍스트 부분 추출
-        generated_text = response.choices[0].message.content
+        generated_text = await generate(request.prompt, request.model, request.max_tokens, request.temperature)
         return {"generated_text": generated_text}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -92,11 +118,7 @@ async def generate_text(request: GenerateMessageRequest):
 @app.post("/classify")
 async def classify(request: ClassifyMessageRequest):
     try:
-        hashtags = get_hashtags(request.isbn)  # ISBN을 이용해 해시태그 가져오기
-
-        # 카테고리 분류 함수 호출
-        main, sub = classify_category(request.title, request.author, request.isbn, request.description, hashtags)
-        return {"title": request.title, "main_category": main, "sub_category": sub}
+        return await book_tasks.classify_book(request.title, request.author, request.isbn, request.description)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -106,7 +128,7 @@ async def classify(request: ClassifyMessageRequest):
 async def crawl(request: CrawlMessageRequest):
     try:
         # 도서 정보 크롤링 함수 호출
-        hashtags = get_hashtags(request.isbn)
+        hashtags = await aget_hashtags(request.isbn)
         return {"isbn": request.isbn, "hashtags": hashtags}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -114,27 +136,69 @@ async def crawl(request: CrawlMessageRequest):
 # 책 정보 추가 엔드포인트
 @app.post("/add-book")
 async def add_book(request: AddBookRequest):
+    chroma_manager = await aget_chroma_manager()
+    isbn = request.isbn
     try:
-        # ISBN으로 책 정보 가져오기
-        book = get_book_info_by_isbn(request.isbn)
-        hashtags = get_hashtags(request.isbn)
-        main_category, sub_category = classify_category(book.title, book.author, book.isbn, book.description, hashtags)
-        
-        # MySQL에 책 정보 추가
-        insert_book_info_to_db(book, category_names=sub_category, hashtags=hashtags)
-        # Chroma DB에 책 정보 추가
-        message = chroma_manager.add_book(book, main_category, sub_category, hashtags)
-        return {"message": message}
+        message, timings = await book_tasks.add_book(chroma_manager, isbn)
+    except PipelineError as e:
+        print(f"/add-book {isbn} failed at {e.stage}: {e} (timings: {e.timings})")
+        if isinstance(e.error, HTTPException):
+            raise e.error
+        status_code = 504 if isinstance(e.error, asyncio.TimeoutError) else 500
+        raise HTTPException(status_code=status_code, detail=str(e))
+
+    print(f"/add-book {isbn} timings: {timings}")
+    return {"message": message, "timings": timings}
+    
+# 책 정보 대량 추가 엔드포인트 (이미 등록된 ISBN은 건너뛰므로 실패 후 같은 요청을 다시 보내면 이어서 처리)
+@app.post("/add-books")
+async def add_books(request: AddBooksRequest):
+    chroma_manager = await aget_chroma_manager()
+    try:
+        results = await ingest_isbns(chroma_manager, request.isbns, batch_size=request.batch_size)
+        return {"results": results, "summary": summarize(results)}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
+
+# 작업 큐 엔드포인트: 작업을 넣고 바로 작업 ID를 반환합니다 (처리는 job_worker.py 워커 프로세스)
+async def _enqueue(kind, payload):
+    try:
+        job_id = await run_blocking(job_queue.enqueue, kind, payload)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+@app.post("/jobs/add-book")
+async def enqueue_add_book(request: AddBookRequest):
+    return await _enqueue("add_book", request.model_dump())
+
+@app.post("/jobs/add-books")
+async def enqueue_add_books(request: AddBooksRequest):
+    return await _enqueue("add_books", request.model_dump())
+
+@app.post("/jobs/classify")
+async def enqueue_classify(request: ClassifyMessageRequest):
+    return await _enqueue("classify", request.model_dump())
+
+# 작업 상태 조회 엔드포인트 (상태, 시도 횟수, 진행 상황, 결과 또는 오류)
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await run_blocking(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="존재하지 않는 작업입니다.")
+    return {
+        key: job[key]
+        for key in ("id", "kind", "status", "attempts", "max_attempts", "progress", "result", "error", "created_at", "updated_at")
+    }
+
 # 책 정보 삭제 엔드포인트
 @app.post("/delete-book")
 async def delete_book(request: AddBookRequest):
+    chroma_manager = await aget_chroma_manager()
     try:
         # Chroma DB에서 책 정보 삭제
-        message = chroma_manager.delete_book(request.isbn)
+        message = await run_blocking(chroma_manager.delete_book, request.isbn)
         return {"message": message}
 
     except Exception as e:
@@ -143,24 +207,92 @@ async def delete_book(request: AddBookRequest):
 # 책 정보 조회 엔드포인트
 @app.get("/get-book")
 async def get_book(isbn: str):
+    chroma_manager = await aget_chroma_manager()
     try:
         # Chroma DB에서 책 정보 조회
-        book_info = chroma_manager.get_book(isbn)
+        book_info = await run_blocking(chroma_manager.get_book, isbn)
         return book_info
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+# 비슷한 책 조회 엔드포인트 (저장된 임베딩을 그대로 사용하므로 임베딩 API를 호출하지 않음)
+@app.get("/similar-books")
+async def similar_books(isbn: str, k: int = Query(10, ge=1, le=SIMILAR_BOOKS_MAX_K), mainCategory: Optional[str] = None, subCategory: Optional[str] = None):
+    chroma_manager = await aget_chroma_manager()
+    try:
+        results = await run_blocking(chroma_manager.similar_books, [isbn], k, mainCategory, subCategory)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if isbn not in results:
+        raise HTTPException(status_code=404, detail="존재하지 않는 책 정보입니다.")
+    return {"isbn": isbn, "similar_books": results[isbn]}
+
+# 여러 ISBN의 비슷한 책을 한 번의 검색으로 조회하는 엔드포인트
+@app.post("/similar-books")
+async def similar_books_batch(request: SimilarBooksRequest):
+    chroma_manager = await aget_chroma_manager()
+    try:
+        results = await run_blocking(
+            chroma_manager.similar_books, request.isbns, request.k, request.mainCategory, request.subCategory
+        )
+        missing = [isbn for isbn in dict.fromkeys(request.isbns) if isbn not in results]
+        return {"results": results, "missing": missing}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 여러 책 정보 조회 엔드포인트 (한 번의 조회로 처리하고, 바뀌지 않았으면 304를 반환)
+@app.get("/get-books")
+async def get_books(request: Request, isbns: List[str] = Query(...), fields: Optional[List[str]] = Query(None)):
+    chroma_manager = await aget_chroma_manager()
+    unknown = [field for field in fields or [] if field not in BOOK_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"알 수 없는 항목입니다: {', '.join(unknown)}")
+
+    try:
+        books = await run_blocking(chroma_manager.get_books, isbns, fields)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    payload = {"books": books, "missing": [isbn for isbn in dict.fromkeys(isbns) if isbn not in books]}
+    # 응답 내용으로 ETag를 만들어, 클라이언트가 가진 것과 같으면 본문 없이 304를 반환합니다.
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    etag = '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=payload, headers=headers)
+
 # 도서 추천 엔드포인트
 @app.post("/recommend")
 async def recommend(request: RecommendRequest):
+    chroma_manager = await aget_chroma_manager()
     # 도서 추천 요청 처리
     try:
-        result = chroma_manager.recommend_book(request.member_id)
-        return {"message": result}
+        return await run_blocking(chroma_manager.recommend_book, request.member_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+# 서버 내부 지표 조회 엔드포인트
+@app.get("/stats")
+async def stats():
+    chroma_manager = await aget_chroma_manager()
+    return {
+        "db_pool": pool_stats(),
+        "embedding_cache": chroma_manager.embedding_function.cache.stats(),
+        "aladin_cache": book_info_cache.stats(),
+        "kyobo_cache": hashtags_cache.stats(),
+        "classifier": classifier_stats(),
+        "classification_cache": classification_cache.stats(),
+        "job_queue": await run_blocking(job_queue.stats),
+        # 외부 서비스별 제한/재시도/차단 횟수와 서킷 상태
+        "outbound": outbound_stats(),
+        "generate": generation_stats(),
+    }
+
 
 if __name__ == "__main__":
     import uvicorn
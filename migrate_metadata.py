@@ -0,0 +1,68 @@
+"""books 컬렉션의 기존 메타데이터를 현재 형식(book_metadata.METADATA_VERSION)으로 배치 단위로 다시 씁니다.
+
+임베딩과 문서는 그대로 두고 메타데이터만 갱신하므로 OpenAI API를 호출하지 않습니다.
+이미 현재 형식인 책은 건너뛰기 때문에 중간에 멈춰도 다시 실행하면 이어서 처리합니다.
+
+사용 예:
+    python migrate_metadata.py --dry-run
+    python migrate_metadata.py --batch-size 500
+"""
+import argparse
+import os
+
+import chromadb
+
+from book_metadata import METADATA_VERSION, upgrade_metadata
+from clients import CHROMA_COLLECTION_NAME, CHROMA_PERSIST_DIRECTORY
+from vector_index import VECTOR_INDEX_PATH, VectorIndex
+
+MIGRATE_BATCH_SIZE = int(os.getenv("MIGRATE_BATCH_SIZE", 500))
+
+
+def migrate(collection, batch_size=MIGRATE_BATCH_SIZE, dry_run=False) -> dict:
+    """컬렉션을 페이지 단위로 읽어 이전 형식의 메타데이터만 update로 다시 쓰고 처리 건수를 반환합니다."""
+    summary = {"scanned": 0, "updated": 0, "current": 0}
+    offset = 0
+    while True:
+        # update는 행 순서를 바꾸지 않으므로 offset 페이지 조회를 그대로 이어갈 수 있습니다.
+        page = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids, metadatas = [], []
+        for isbn, metadata in zip(page["ids"], page["metadatas"]):
+            upgraded = upgrade_metadata(metadata or {})
+            if upgraded is None:
+                summary["current"] += 1
+                continue
+            ids.append(isbn)
+            metadatas.append(upgraded)
+        if ids and not dry_run:
+            collection.update(ids=ids, metadatas=metadatas)
+        summary["scanned"] += len(page["ids"])
+        summary["updated"] += len(ids)
+        offset += len(page["ids"])
+        print(f"Metadata migration progress: {summary['scanned']} scanned, {summary['updated']} updated")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=MIGRATE_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="바꿀 책 수만 세고 저장하지 않음")
+    parser.add_argument("--vector-index-path", default=VECTOR_INDEX_PATH,
+                        help="이 경로에 벡터 인덱스 스냅샷이 있으면 이전 후 컬렉션에서 다시 만듦")
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIRECTORY)
+    collection = client.get_collection(CHROMA_COLLECTION_NAME)
+    summary = migrate(collection, args.batch_size, args.dry_run)
+    print(f"Metadata version {METADATA_VERSION}: {summary}")
+
+    # 인덱스 모드의 스냅샷은 메타데이터 사본을 들고 있으므로 새로 만들어 실행 중인 워커가 다시 읽게 합니다.
+    index = VectorIndex(args.vector_index_path)
+    if summary["updated"] and not args.dry_run and index.exists():
+        index.build(collection)
+
+
+if __name__ == "__main__":
+    main()
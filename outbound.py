@@ -0,0 +1,260 @@
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+import httpx
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 외부 서비스별 기본 정책. 환경 변수 OUTBOUND_<이름>_<항목>으로 바꿀 수 있습니다 (예: OUTBOUND_KYOBO_RATE=1).
+DEFAULT_POLICIES = {
+    # rate: 초당 요청 수, burst: 순간 최대 요청 수, timeout: 요청 제한 시간(초), max_attempts: 최대 시도 횟수
+    "aladin": {"rate": 5.0, "burst": 10, "timeout": 10.0, "max_attempts": 3},
+    "kyobo": {"rate": 2.0, "burst": 4, "timeout": 10.0, "max_attempts": 3},
+    "openai": {"rate": 10.0, "burst": 20, "timeout": 60.0, "max_attempts": 3},
+}
+# 재시도는 최근 요청 수의 이 비율까지만 허용해 장애 시 재시도가 부하를 키우지 않게 합니다 (최소 OUTBOUND_RETRY_MIN회).
+OUTBOUND_RETRY_RATIO = float(os.getenv("OUTBOUND_RETRY_RATIO", 0.2))
+OUTBOUND_RETRY_MIN = int(os.getenv("OUTBOUND_RETRY_MIN", 10))
+OUTBOUND_RETRY_WINDOW = float(os.getenv("OUTBOUND_RETRY_WINDOW", 60))
+OUTBOUND_BACKOFF_BASE = float(os.getenv("OUTBOUND_BACKOFF_BASE", 0.5))
+OUTBOUND_BACKOFF_MAX = float(os.getenv("OUTBOUND_BACKOFF_MAX", 20))
+# 연속 실패가 이 횟수에 이르면 OUTBOUND_BREAKER_RESET초 동안 요청을 보내지 않고 바로 실패시킵니다.
+OUTBOUND_BREAKER_THRESHOLD = int(os.getenv("OUTBOUND_BREAKER_THRESHOLD", 5))
+OUTBOUND_BREAKER_RESET = float(os.getenv("OUTBOUND_BREAKER_RESET", 30))
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """외부 서비스가 장애 상태로 판단되어 요청을 보내지 않고 실패시킬 때 발생합니다."""
+
+
+class TokenBucket:
+    """초당 `rate`개씩 채워지고 최대 `burst`개까지 쌓이는 토큰 버킷입니다."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """토큰 하나를 예약하고, 사용할 수 있을 때까지 기다려야 하는 시간(초)을 반환합니다."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+def _status_code(error):
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+    return status_code
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_transient(error) -> bool:
+    """다시 시도하면 성공할 수 있는(그리고 장애로 셀) 오류인지 확인합니다."""
+    status_code = _status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    # openai는 처음 사용할 때 import되므로, 불러온 경우에만 그 연결 오류 타입을 확인합니다.
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(error, openai.APIConnectionError)
+
+
+class Upstream:
+    """외부 서비스 하나에 대한 속도 제한, 재시도, 서킷 브레이커를 묶은 호출 정책입니다.
+
+    `call`/`acall`에 넘기는 함수는 요청을 보내고 실패 시 예외를 발생시켜야 합니다 (`raise_for_status` 포함).
+    429/5xx, 시간 초과, 연결 오류는 지터를 섞은 지수 백오프로 재시도 예산 안에서 다시 시도하고,
+    그 밖의 오류(404 등)는 바로 호출한 쪽으로 전달합니다.
+    """
+
+    def __init__(self, name, rate, burst, timeout, max_attempts,
+                 breaker_threshold=OUTBOUND_BREAKER_THRESHOLD, breaker_reset=OUTBOUND_BREAKER_RESET):
+        self.name = name
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self._bucket = TokenBucket(rate, burst)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._window_started = time.monotonic()
+        self._window_calls = 0
+        self._window_retries = 0
+        self._stats = {
+            "calls": 0, "succeeded": 0, "failed": 0, "throttled": 0, "throttled_seconds": 0.0,
+            "retried": 0, "retry_budget_exhausted": 0, "short_circuited": 0, "circuit_opened": 0,
+        }
+
+    # --- 서킷 브레이커 ---
+
+    def _before_call(self):
+        with self._lock:
+            self._stats["calls"] += 1
+            self._roll_window()
+            self._window_calls += 1
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.breaker_reset or self._trial:
+                self._stats["short_circuited"] += 1
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            # 대기 시간이 지나면 한 요청만 보내서 복구 여부를 확인합니다 (half-open).
+            self._trial = True
+
+    def _on_success(self):
+        with self._lock:
+            self._stats["succeeded"] += 1
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def _on_failure(self, transient):
+        with self._lock:
+            self._stats["failed"] += 1
+            if not transient:
+                # 404 같은 응답은 서비스가 살아 있다는 뜻이므로 장애로 세지 않습니다.
+                self._failures = 0
+                self._opened_at = None
+                self._trial = False
+                return
+            self._failures += 1
+            if self._trial or self._failures >= self.breaker_threshold:
+                if self._opened_at is None or self._trial:
+                    self._stats["circuit_opened"] += 1
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    # --- 재시도 예산 ---
+
+    def _roll_window(self):
+        if time.monotonic() - self._window_started >= OUTBOUND_RETRY_WINDOW:
+            self._window_started = time.monotonic()
+            self._window_calls = 0
+            self._window_retries = 0
+
+    def _retry_delay(self, attempt, error):
+        """다시 시도할 수 있으면 기다릴 시간(초)을, 아니면 None을 반환합니다."""
+        if attempt >= self.max_attempts or not _is_transient(error):
+            return None
+        with self._lock:
+            self._roll_window()
+            if self._window_retries >= max(OUTBOUND_RETRY_MIN, OUTBOUND_RETRY_RATIO * self._window_calls):
+                self._stats["retry_budget_exhausted"] += 1
+                return None
+            self._window_retries += 1
+            self._stats["retried"] += 1
+        # 전체 지터: 0 ~ 지수적으로 늘어난 상한 사이의 임의 시간. 서버가 Retry-After를 주면 그보다 짧게 기다리지 않습니다.
+        delay = random.uniform(0, min(OUTBOUND_BACKOFF_MAX, OUTBOUND_BACKOFF_BASE * 2 ** (attempt - 1)))
+        return max(delay, min(_retry_after(error) or 0.0, OUTBOUND_BACKOFF_MAX))
+
+    def _throttle_delay(self):
+        delay = self._bucket.reserve()
+        if delay > 0:
+            with self._lock:
+                self._stats["throttled"] += 1
+                self._stats["throttled_seconds"] += delay
+        return delay
+
+    # --- 호출 ---
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            self._before_call()
+            time.sleep(self._throttle_delay())
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self._on_failure(_is_transient(e))
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                print(f"{self.name} 요청 실패, {delay:.1f}초 후 다시 시도합니다 ({attempt}/{self.max_attempts}): {e}")
+                time.sleep(delay)
+                continue
+            self._on_success()
+            return result
+
+    async def acall(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            self._before_call()
+            try:
+                await asyncio.sleep(self._throttle_delay())
+                result = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                # 대기 중이든 요청 중이든 취소되면 half-open 시험 요청을 내려놓아 다음 요청이 다시 시험할 수 있게 합니다.
+                with self._lock:
+                    self._trial = False
+                raise
+            except Exception as e:
+                self._on_failure(_is_transient(e))
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+                print(f"{self.name} 요청 실패, {delay:.1f}초 후 다시 시도합니다 ({attempt}/{self.max_attempts}): {e}")
+                await asyncio.sleep(delay)
+                continue
+            self._on_success()
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["circuit"] = "closed" if self._opened_at is None else ("half_open" if self._trial else "open")
+        return stats
+
+
+_upstreams = {}
+_upstreams_lock = threading.Lock()
+
+
+def _policy(name):
+    policy = dict(DEFAULT_POLICIES.get(name, DEFAULT_POLICIES["aladin"]))
+    for key, value in policy.items():
+        override = os.getenv(f"OUTBOUND_{name.upper()}_{key.upper()}")
+        if override is not None:
+            policy[key] = type(value)(override)
+    return policy
+
+
+def get_upstream(name) -> Upstream:
+    """이름별로 프로세스에 하나뿐인 호출 정책을 반환합니다."""
+    with _upstreams_lock:
+        if name not in _upstreams:
+            _upstreams[name] = Upstream(name, **_policy(name))
+        return _upstreams[name]
+
+
+def outbound_stats() -> dict:
+    with _upstreams_lock:
+        upstreams = dict(_upstreams)
+    return {name: upstream.stats() for name, upstream in upstreams.items()}
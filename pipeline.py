@@ -0,0 +1,61 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, NamedTuple, Tuple
+
+
+class Stage(NamedTuple):
+    """파이프라인의 한 단계입니다. `func`는 선행 단계의 결과를 같은 이름의 키워드 인자로 받습니다."""
+    func: Callable[..., Awaitable]
+    deps: Tuple[str, ...] = ()
+    timeout: float = 30.0
+
+
+class PipelineError(Exception):
+    """특정 단계가 실패하거나 제한 시간을 넘겼을 때 발생합니다."""
+
+    def __init__(self, stage: str, error: BaseException, timings: dict):
+        self.stage = stage
+        self.error = error
+        self.timings = timings
+        reason = "timed out" if isinstance(error, asyncio.TimeoutError) else str(error)
+        super().__init__(f"stage '{stage}' failed: {reason}")
+
+
+async def run_pipeline(stages: dict) -> Tuple[dict, dict]:
+    """의존 관계가 없는 단계는 동시에 실행하고 (단계별 결과, 단계별 소요 시간(초))을 반환합니다.
+
+    전체 소요 시간은 모든 단계의 합이 아니라 가장 긴 의존 경로에 의해 결정됩니다.
+    """
+    timings = {}
+    tasks = {}
+    started = time.perf_counter()
+
+    async def run(name, stage):
+        inputs = {dep: await tasks[dep] for dep in stage.deps}
+        stage_started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(stage.func(**inputs), timeout=stage.timeout)
+        except Exception as e:
+            raise PipelineError(name, e, timings) from e
+        finally:
+            timings[name] = time.perf_counter() - stage_started
+
+    for name, stage in stages.items():
+        unknown = [dep for dep in stage.deps if dep not in stages]
+        if unknown:
+            raise ValueError(f"stage '{name}' depends on unknown stages: {unknown}")
+    # 모든 단계를 먼저 태스크로 등록한 뒤 실행합니다 (선행 단계는 태스크를 await해서 기다림).
+    for name, stage in stages.items():
+        tasks[name] = asyncio.ensure_future(run(name, stage))
+
+    try:
+        results = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+    except PipelineError as e:
+        # 남은 단계는 취소하고 정리될 때까지 기다립니다.
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        timings["total"] = time.perf_counter() - started
+        raise e
+    timings["total"] = time.perf_counter() - started
+    return results, timings
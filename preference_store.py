@@ -0,0 +1,90 @@
+import hashlib
+import os
+
+# 벡터를 만드는 방식이 바뀌면 올려서 저장된 벡터를 모두 다시 계산하도록 합니다.
+PREFERENCE_VECTOR_VERSION = "v2-sub-category-mean"
+PREFERENCE_COLLECTION_NAME = os.getenv("PREFERENCE_COLLECTION_NAME", "member_preferences")
+PREFERENCE_BATCH_SIZE = int(os.getenv("PREFERENCE_BATCH_SIZE", 500))
+
+
+def preference_checksum(preferences, version=PREFERENCE_VECTOR_VERSION) -> str:
+    """선호 서브 카테고리 집합과 벡터 생성 방식으로 만든 체크섬입니다. 순서와 중복은 무시합니다."""
+    payload = version + "\0" + "\0".join(sorted(set(preferences)))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class MemberPreferenceStore:
+    """회원별 선호 벡터를 별도의 Chroma 컬렉션에 저장하고, 선호가 바뀐 회원만 다시 계산합니다.
+
+    각 항목의 메타데이터에 선호 체크섬을 저장해 두고, 현재 선호의 체크섬과 다를 때만 다시 계산합니다.
+    """
+
+    def __init__(self, client, sub_category_embeddings, collection_name=PREFERENCE_COLLECTION_NAME):
+        self.collection = client.get_or_create_collection(collection_name)
+        self.sub_category_embeddings = sub_category_embeddings
+        # 서브 카테고리 행렬이 다시 계산되면 회원 벡터도 모두 다시 만들어지도록 체크섬에 포함합니다.
+        self.version = f"{PREFERENCE_VECTOR_VERSION}:{sub_category_embeddings.checksum}"
+
+    def _load(self, member_ids):
+        """저장된 {member_id: (체크섬, 벡터)}를 가져옵니다."""
+        stored = {}
+        ids = [str(member_id) for member_id in member_ids]
+        for offset in range(0, len(ids), PREFERENCE_BATCH_SIZE):
+            results = self.collection.get(
+                ids=ids[offset:offset + PREFERENCE_BATCH_SIZE], include=["metadatas", "embeddings"]
+            )
+            for member_id, metadata, embedding in zip(results["ids"], results["metadatas"], results["embeddings"]):
+                stored[member_id] = (metadata.get("checksum"), embedding)
+        return stored
+
+    def _compute(self, preference_sets):
+        """선호 집합 목록에 대한 벡터 목록을 서브 카테고리 행렬에서 한 번에 계산합니다 (API 호출 없음)."""
+        return self.sub_category_embeddings.compose(preference_sets).tolist()
+
+    def vectors_for(self, member_preferences: dict):
+        """{member_id: [선호 이름, ...]}에 대한 ({member_id: 벡터}, 통계)를 반환합니다.
+
+        선호가 바뀌었거나 저장된 벡터가 없는 회원만 계산하고, 같은 선호 조합은 한 번만 계산합니다.
+        """
+        stored = self._load(member_preferences)
+
+        vectors = {}
+        stale = {}
+        for member_id, preferences in member_preferences.items():
+            checksum = preference_checksum(preferences, self.version)
+            entry = stored.get(str(member_id))
+            if entry is not None and entry[0] == checksum:
+                vectors[member_id] = entry[1]
+            else:
+                stale.setdefault(checksum, (preferences, []))[1].append(member_id)
+
+        if stale:
+            checksums = list(stale)
+            computed = self._compute([stale[checksum][0] for checksum in checksums])
+            ids, embeddings, metadatas = [], [], []
+            for checksum, vector in zip(checksums, computed):
+                for member_id in stale[checksum][1]:
+                    vectors[member_id] = vector
+                    ids.append(str(member_id))
+                    embeddings.append(vector)
+                    metadatas.append({"checksum": checksum})
+            for offset in range(0, len(ids), PREFERENCE_BATCH_SIZE):
+                window = slice(offset, offset + PREFERENCE_BATCH_SIZE)
+                self.collection.upsert(ids=ids[window], embeddings=embeddings[window], metadatas=metadatas[window])
+
+        refreshed = sum(len(member_ids) for _, member_ids in stale.values())
+        return vectors, {"reused": len(vectors) - refreshed, "refreshed": refreshed, "computed": len(stale)}
+
+    def prune(self, member_ids, owns=None):
+        """`member_ids`에 없는(선호가 사라진) 회원의 벡터를 삭제합니다.
+
+        `owns`를 주면 그 함수가 참을 반환하는 회원(예: 같은 샤드)만 정리 대상으로 봅니다.
+        """
+        keep = {str(member_id) for member_id in member_ids}
+        stale = [
+            member_id for member_id in self.collection.get(include=[])["ids"]
+            if member_id not in keep and (owns is None or owns(member_id))
+        ]
+        for offset in range(0, len(stale), PREFERENCE_BATCH_SIZE):
+            self.collection.delete(ids=stale[offset:offset + PREFERENCE_BATCH_SIZE])
+        return len(stale)
@@ -0,0 +1,35 @@
+import numpy as np
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def mmr(query_embedding, candidate_embeddings, k=None, lambda_mult=0.5):
+    """MMR(Maximal Marginal Relevance)로 후보를 다시 정렬해 선택된 후보의 인덱스 목록을 반환합니다.
+
+    `lambda_mult`가 1이면 질의와의 유사도만, 0이면 이미 고른 후보와의 차이만 봅니다.
+    """
+    if len(candidate_embeddings) == 0:
+        return []
+    k = len(candidate_embeddings) if k is None else min(k, len(candidate_embeddings))
+    candidates = _normalize(candidate_embeddings)
+    relevance = candidates @ _normalize(query_embedding)
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    # 각 후보가 지금까지 고른 후보들과 가장 비슷한 정도
+    max_similarity = similarity[selected[0]].copy()
+    remaining = np.ones(len(candidates), dtype=bool)
+    remaining[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~remaining] = -np.inf
+        index = int(np.argmax(scores))
+        selected.append(index)
+        remaining[index] = False
+        np.maximum(max_similarity, similarity[index], out=max_similarity)
+    return selected
@@ -0,0 +1,278 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from blocking import run_blocking
+
+load_dotenv()
+
+# 비워두면 디스크 저장 없이 메모리에만 캐시합니다.
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "./response_cache.sqlite3")
+RESPONSE_CACHE_MEMORY_SIZE = int(os.getenv("RESPONSE_CACHE_MEMORY_SIZE", 2048))
+# 여러 프로세스(uvicorn/작업 워커)가 같은 파일을 쓰므로 잠금을 이 시간(초)까지 기다립니다.
+RESPONSE_CACHE_DB_TIMEOUT = float(os.getenv("RESPONSE_CACHE_DB_TIMEOUT", 30))
+
+_MISSING = object()
+
+_disk_connections = {}
+_disk_lock = threading.Lock()
+
+
+def _open_disk(path):
+    """같은 프로세스에서 같은 파일을 쓰는 캐시끼리 SQLite 연결 하나를 공유합니다.
+
+    fork로 물려받은 연결은 쓰면 안 되므로 프로세스 ID별로 처음 사용할 때 엽니다.
+    """
+    connection_key = (os.getpid(), path)
+    with _disk_lock:
+        if connection_key not in _disk_connections:
+            db = sqlite3.connect(path, timeout=RESPONSE_CACHE_DB_TIMEOUT, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+            db.commit()
+            _disk_connections[connection_key] = (db, threading.Lock())
+        return _disk_connections[connection_key]
+
+
+class _LeaderCancelled(Exception):
+    """비동기 요청 병합용: 먼저 시작한 요청이 취소되어 기다리던 요청이 직접 다시 가져와야 함을 알립니다."""
+
+
+class _Call:
+    """동기 요청 병합용: 먼저 온 스레드가 가져온 결과를 기다리는 스레드들과 공유합니다."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """외부 API 응답을 키(ISBN 등)별로 TTL 동안 보관하는 캐시입니다.
+
+    - 메모리 LRU 뒤에 선택적으로 SQLite 파일을 두어 재시작 후에도 유지합니다.
+    - `None`(찾을 수 없음) 결과는 `negative_ttl` 동안만 보관합니다.
+    - 같은 키에 대한 동시 요청은 한 번의 외부 요청으로 합쳐집니다.
+
+    `encode`/`decode`는 값을 JSON으로 저장할 수 있는 형태로 바꾸는 함수입니다.
+    """
+
+    def __init__(self, namespace, ttl, negative_ttl, memory_size=RESPONSE_CACHE_MEMORY_SIZE,
+                 disk_path=RESPONSE_CACHE_PATH, encode=None, decode=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory_size = memory_size
+        self.encode = encode or (lambda value: value)
+        self.decode = decode or (lambda value: value)
+        self._disk_path = disk_path
+        self._memory = OrderedDict()  # key -> (만료 시각, 인코딩된 값)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._sync_inflight = {}
+        self._stats = {"hits": 0, "negative_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "stores": 0}
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _lookup_memory(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+        return _MISSING
+
+    def _lookup(self, key):
+        encoded = self._lookup_memory(key)
+        if encoded is _MISSING:
+            encoded = self._lookup_disk(key)
+        return encoded
+
+    async def _alookup(self, key):
+        # SQLite 조회는 이벤트 루프를 막지 않도록 메모리에 없을 때만 스레드 풀에서 실행합니다.
+        encoded = self._lookup_memory(key)
+        if encoded is _MISSING and self._disk is not None:
+            encoded = await run_blocking(self._lookup_disk, key)
+        return encoded
+
+    @property
+    def _disk(self):
+        return _open_disk(self._disk_path) if self._disk_path else None
+
+    def _lookup_disk(self, key):
+        now = time.time()
+        if self._disk is not None:
+            db, disk_lock = self._disk
+            try:
+                with disk_lock:
+                    row = db.execute(
+                        "SELECT value, expires_at FROM responses WHERE namespace = ? AND key = ?", (self.namespace, key)
+                    ).fetchone()
+            except sqlite3.Error as e:
+                # 캐시를 읽지 못하면 없는 것으로 보고 원래 요청을 보냅니다.
+                print(f"응답 캐시 조회 실패 ({self.namespace}): {e}")
+                return _MISSING
+            if row is not None and row[1] > now:
+                encoded = json.loads(row[0])
+                with self._lock:
+                    self._remember(key, row[1], encoded)
+                    self._stats["disk_hits"] += 1
+                return encoded
+        return _MISSING
+
+    def _remember(self, key, expires_at, encoded):
+        self._memory[key] = (expires_at, encoded)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key, default=None):
+        """캐시된 값을 반환합니다. 없거나 만료되었으면 `default`를 반환합니다."""
+        encoded = self._lookup(key)
+        if encoded is _MISSING:
+            return default
+        return None if encoded is None else self.decode(encoded)
+
+    async def aget(self, key, default=None):
+        """get의 비동기 버전입니다."""
+        encoded = await self._alookup(key)
+        if encoded is _MISSING:
+            return default
+        return None if encoded is None else self.decode(encoded)
+
+    def _store_memory(self, key, value):
+        encoded = None if value is None else self.encode(value)
+        expires_at = time.time() + (self.negative_ttl if value is None else self.ttl)
+        with self._lock:
+            self._remember(key, expires_at, encoded)
+            self._stats["stores"] += 1
+        return encoded, expires_at
+
+    def set(self, key, value):
+        self._store_disk(key, *self._store_memory(key, value))
+
+    async def aset(self, key, value):
+        """set의 비동기 버전입니다. 메모리에는 바로 넣고 SQLite 쓰기는 스레드 풀에서 실행합니다."""
+        encoded, expires_at = self._store_memory(key, value)
+        if self._disk is not None:
+            await run_blocking(self._store_disk, key, encoded, expires_at)
+
+    def _store_disk(self, key, encoded, expires_at):
+        if self._disk is not None:
+            db, disk_lock = self._disk
+            with disk_lock:
+                try:
+                    db.execute(
+                        "INSERT OR REPLACE INTO responses (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                        (self.namespace, key, json.dumps(encoded, ensure_ascii=False), expires_at)
+                    )
+                    db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+                    db.commit()
+                except sqlite3.Error as e:
+                    # 저장에 실패해도 이미 가져온 값은 그대로 돌려주도록 기록만 남깁니다 (메모리 캐시에는 남아 있음).
+                    db.rollback()
+                    print(f"응답 캐시 저장 실패 ({self.namespace}): {e}")
+
+    def _count_hit(self, encoded):
+        if encoded is _MISSING:
+            return _MISSING
+        self._count("negative_hits" if encoded is None else "hits")
+        return None if encoded is None else self.decode(encoded)
+
+    def _hit(self, key):
+        return self._count_hit(self._lookup(key))
+
+    async def aget_or_fetch(self, key, fetch):
+        """캐시에 없으면 `fetch()` 코루틴으로 가져와 저장합니다. 예외는 캐시하지 않고 그대로 전달합니다.
+
+        먼저 시작한 요청이 취소되면 기다리던 요청 중 하나가 이어서 가져오고, 나머지는 그 결과를 기다립니다.
+        """
+        while True:
+            value = self._count_hit(await self._alookup(key))
+            if value is not _MISSING:
+                return value
+
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self._count("coalesced")
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                continue
+
+        self._count("misses")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+            await self.aset(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            # 기다리던 요청까지 취소하지 않고 다시 시도하게 합니다.
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 기다리는 요청이 없어도 경고가 남지 않도록 표시
+            raise
+        finally:
+            del self._inflight[key]
+
+    def get_or_fetch(self, key, fetch):
+        """aget_or_fetch의 동기 버전입니다. 같은 키를 동시에 요청한 스레드는 먼저 시작한 요청의 결과를 기다립니다."""
+        value = self._hit(key)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            call = self._sync_inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._sync_inflight[key] = _Call()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fetch()
+            self.set(key, call.value)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._sync_inflight[key]
+            call.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["negative_hits"]) / lookups if lookups else 0.0
+        return stats
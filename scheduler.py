@@ -1,71 +1,67 @@
 import time
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from database_conn import get_all_member_ids
-from database_conn import insert_book_info_to_db
-from database_conn import get_book_id_by_isbn
+from database_conn import get_book_ids_by_isbns
 from database_conn import insert_best_sellers
 
-from book_info import get_best_sellers
-from category_classifier import classify_category
+from book_info import aget_best_sellers
+from bulk_ingest import ingest_isbns, summarize
+import os
+from datetime import datetime
 
-from crawling import get_hashtags
+from blocking import run_blocking
+from clients import aget_chroma_manager
+from job_lock import run_claimed, run_once
 
-from chroma_manager import ChromaManager
 
-chroma_manager = ChromaManager(persist_directory="./chroma_db", collection_name="books")
+# 회원 추천 작업을 나눌 샤드 수. 워커마다 아직 아무도 맡지 않은 샤드를 가져가서 처리합니다.
+RECOMMEND_SHARDS = int(os.getenv("RECOMMEND_SHARDS", 1))
+
+async def _recommend_shard(shard):
+    # 선호 조회, 임베딩, 검색, book_id 조회, 저장을 모두 배치로 처리
+    chroma_manager = await aget_chroma_manager()
+    summary = await run_blocking(
+        chroma_manager.recommend_books_for_all_members, shard=shard if RECOMMEND_SHARDS > 1 else None
+    )
+    timings = ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in summary["timings"].items())
+    print(f"Recommendations for shard {shard[0] + 1}/{shard[1]} have been completed. "
+          f"members={summary['members']}, groups={summary['preference_groups']}, saved={summary['saved']}, "
+          f"exhausted={summary['exhausted']} ({timings})")
 
 async def run_recommendations_for_all_members():
-    # MySQL에서 전체 member_id 가져오기
-    member_ids = get_all_member_ids()
     print("Running recommendations for all members...")
-    # 각 멤버에 대해 도서 추천 함수 실행
-    for member_id in member_ids:
-        chroma_manager.recommend_book(member_id)
+    run_key = datetime.now().strftime("%Y-%m-%d")
+    # 모든 워커에서 같은 시각에 실행되지만, 샤드마다 실행권을 얻은 워커 하나만 처리합니다.
+    for index in range(RECOMMEND_SHARDS):
+        shard = (index, RECOMMEND_SHARDS)
+        await run_claimed(f"recommendations:{index}/{RECOMMEND_SHARDS}", run_key, _recommend_shard, shard)
     print("Recommendations for all members have been completed.")
     
-# 베스트셀러 업데이트 작업 정의
+# 베스트셀러 업데이트 작업 정의 (여러 워커 중 한 곳에서 한 달에 한 번만 실행)
+@run_once("best_sellers", "%Y-%m")
 async def best_sellers_update_task():
-    best_sellers_list_from_aladin = get_best_sellers()
-    best_sellers_for_save = []
-    
-    # 각 책의 정보를 검사
-    for best_book in best_sellers_list_from_aladin:
-        isbn = best_book.isbn  # Book 객체의 isbn 가져오기
-        book_id = get_book_id_by_isbn(isbn)
-        title = best_book.title
-        author = best_book.author
-        description = best_book.description
-        best_rank = best_book.best_rank
-        
-        # ISBN이 데이터베이스에 존재하는지 확인
-        if book_id is None:
-            # ISBN이 없을 경우 책 정보를 데이터베이스에 추가
-            hashtags = get_hashtags(isbn)
-            
-            
-            main_category, sub_category = classify_category(title, author, isbn, description, hashtags)
-            # MySQL에 책 정보 추가
-            insert_book_info_to_db(best_book.getBook(), category_names=sub_category, hashtags=hashtags)
-            # Chroma DB에 책 정보 추가
-            chroma_manager.add_book(best_book.getBook(), main_category, sub_category, hashtags)
+    best_sellers_list_from_aladin = await aget_best_sellers()
+    if not best_sellers_list_from_aladin:
+        print("베스트셀러를 가져오지 못해 작업을 종료합니다.")
+        return
 
-        else:
-            # ISBN이 이미 있으면 필요 시 업데이트 (생략 가능)
-            print(f"책 {title} (ISBN: {isbn})는 이미 데이터베이스에 있습니다.")
-        
-        best_seller = {
-                'isbn': isbn,
-                'best_rank': best_rank
-        }
-        
-        best_sellers_for_save.append(best_seller)
-    
-    for test in best_sellers_for_save:
-        print(test['isbn'])
-        print(test['best_rank'])
-    
-    insert_best_sellers(best_sellers_for_save)
+    # ISBN이 데이터베이스에 존재하는지 한 번의 IN 조회로 확인
+    isbns = [best_book.isbn for best_book in best_sellers_list_from_aladin]
+    book_ids = await run_blocking(get_book_ids_by_isbns, isbns)
+    missing = [isbn for isbn in isbns if isbn not in book_ids]
+    print(f"베스트셀러 {len(isbns)}권 중 {len(isbns) - len(missing)}권은 이미 데이터베이스에 있습니다.")
+
+    # 없는 책만 동시 실행 수를 제한해 해시태그 수집/분류하고, MySQL과 Chroma에 배치로 저장
+    # (책 정보는 베스트셀러 조회 시 캐시에 저장되어 알라딘에 다시 요청하지 않음)
+    # MySQL에만 없는 책도 저장해야 하므로 Chroma 존재 여부로 건너뛰지 않습니다.
+    if missing:
+        results = await ingest_isbns(await aget_chroma_manager(), missing, skip_existing=False)
+        print(f"베스트셀러 도서 등록 결과: {summarize(results)}")
+
+    best_sellers_for_save = [
+        {'isbn': best_book.isbn, 'best_rank': best_book.best_rank} for best_book in best_sellers_list_from_aladin
+    ]
+    await run_blocking(insert_best_sellers, best_sellers_for_save)
     print("스케줄러 종료")
 
 
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from category_registry import SUB_CATEGORIES
+
+SUB_CATEGORY_EMBEDDINGS_PATH = os.getenv("SUB_CATEGORY_EMBEDDINGS_PATH", "./sub_category_embeddings.npz")
+
+
+class SubCategoryEmbeddings:
+    """서브 카테고리마다 임베딩을 한 번씩만 계산해 NumPy 행렬로 저장해 둡니다.
+
+    회원 선호 벡터는 선택한 서브 카테고리 행들의 (가중) 평균을 정규화해서 만들기 때문에
+    추천 경로에서 임베딩 API를 호출하지 않습니다. 분류 기준(이름 목록)이나 임베딩 모델이 바뀌면
+    체크섬이 달라져 행렬을 다시 계산합니다.
+    """
+
+    def __init__(self, embedding_function, names=SUB_CATEGORIES, path=SUB_CATEGORY_EMBEDDINGS_PATH):
+        self.embedding_function = embedding_function
+        self.path = path
+        self._lock = threading.Lock()
+        self._names = list(names)
+        self.checksum = self._checksum(self._names)
+        self._load_or_build()
+
+    def _checksum(self, names) -> str:
+        model = getattr(self.embedding_function, "model", "")
+        return hashlib.sha1("\0".join([model, *names]).encode("utf-8")).hexdigest()
+
+    def _load_or_build(self):
+        if self.path and os.path.exists(self.path):
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data["checksum"]) == self.checksum:
+                    self._set(list(data["names"]), data["vectors"])
+                    return
+            print("서브 카테고리 목록이 바뀌어 임베딩 행렬을 다시 계산합니다.")
+        self._set(self._names, self._embed(self._names))
+        self._save()
+
+    def _embed(self, names):
+        vectors = np.asarray(self.embedding_function.embed_documents(list(names)), dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def _set(self, names, vectors):
+        self.names = list(names)
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.index = {name: row for row, name in enumerate(self.names)}
+
+    def _save(self):
+        if self.path:
+            np.savez(self.path, names=np.array(self.names), vectors=self.vectors, checksum=np.array(self.checksum))
+
+    def _ensure(self, names):
+        """분류 기준에 없는 이름(DB에만 있는 서브 카테고리 등)이 있으면 한 번만 임베딩해서 행렬에 추가합니다."""
+        missing = [name for name in dict.fromkeys(names) if name not in self.index]
+        if not missing:
+            return
+        with self._lock:
+            missing = [name for name in missing if name not in self.index]
+            if missing:
+                self._set(self.names + missing, np.vstack([self.vectors, self._embed(missing)]))
+                self._save()
+
+    def compose(self, preference_sets, weights=None) -> np.ndarray:
+        """선호 서브 카테고리 집합 목록을 (집합 수, 차원) 크기의 정규화된 벡터 행렬로 만듭니다.
+
+        `weights`는 {서브 카테고리 이름: 가중치}이며, 주지 않으면 모두 같은 가중치로 평균을 냅니다.
+        """
+        preference_sets = [list(dict.fromkeys(preferences)) for preferences in preference_sets]
+        self._ensure(name for preferences in preference_sets for name in preferences)
+
+        with self._lock:
+            index, vectors = self.index, self.vectors
+
+        # 희소 선택 행렬 (집합 수 x 서브 카테고리 수)을 만든 뒤 한 번의 행렬 곱으로 모두 합칩니다.
+        rows = np.fromiter((row for row, preferences in enumerate(preference_sets) for _ in preferences), dtype=np.int64)
+        names = [name for preferences in preference_sets for name in preferences]
+        cols = np.fromiter((index[name] for name in names), dtype=np.int64, count=len(names))
+        values = np.fromiter(((weights or {}).get(name, 1.0) for name in names), dtype=np.float32, count=len(names))
+        selection = np.zeros((len(preference_sets), len(vectors)), dtype=np.float32)
+        np.add.at(selection, (rows, cols), values)
+
+        composed = selection @ vectors
+        norms = np.linalg.norm(composed, axis=1, keepdims=True)
+        return composed / np.where(norms == 0, 1, norms)
@@ -0,0 +1,319 @@
+import fcntl
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "./vector_index")
+# 이 개수만큼 추가/삭제가 쌓이면 스냅샷 파일을 다시 씁니다.
+VECTOR_INDEX_FLUSH_EVERY = int(os.getenv("VECTOR_INDEX_FLUSH_EVERY", 50))
+# 다른 워커가 스냅샷을 갱신했는지 확인하는 최소 간격(초)
+VECTOR_INDEX_RELOAD_INTERVAL = float(os.getenv("VECTOR_INDEX_RELOAD_INTERVAL", 10))
+VECTOR_INDEX_BUILD_BATCH = 1000
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _matches(metadata, where) -> bool:
+    """Chroma where 필터 중 $and/$or와 $eq/$ne/$in/$nin 비교를 메타데이터 하나에 적용합니다."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            for operator, value in condition.items():
+                actual = metadata.get(key)
+                if operator == "$eq":
+                    matched = actual == value
+                elif operator == "$ne":
+                    matched = actual != value
+                elif operator == "$in":
+                    matched = actual in value
+                elif operator == "$nin":
+                    matched = actual not in value
+                else:
+                    raise ValueError(f"unsupported where operator: {operator}")
+                if not matched:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class VectorIndex:
+    """books 컬렉션의 임베딩 전체를 연속된 float32 행렬로 들고 있는 메모리 인덱스입니다.
+
+    스냅샷은 `vectors-<버전>.npy`(정규화된 임베딩)와 `meta-<버전>.json`(ISBN, 메타데이터, 설명)으로 저장하고,
+    `CURRENT` 파일이 현재 버전을 가리킵니다. 행렬은 memmap으로 열기 때문에 시작이 빠르고,
+    같은 호스트의 uvicorn 워커들은 운영체제 페이지 캐시를 공유합니다.
+    추가/삭제는 메모리에 바로 반영하고 기록해 두었다가, 저장할 때 다른 워커가 그 사이 쓴 최신 스냅샷 위에
+    다시 적용해서 서로의 변경을 덮어쓰지 않습니다.
+    검색은 행렬 곱으로 정확한 top-k를 구하며, 거리 값은 Chroma 기본(l2, 제곱 거리)과 같은 척도로 돌려줍니다.
+    """
+
+    def __init__(self, path=VECTOR_INDEX_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._version = None
+        self._checked_at = 0.0
+        self._journal = []
+        self._set(np.zeros((0, 0), dtype=np.float32), [], [], [])
+
+    # --- 스냅샷 파일 ---
+
+    def _current_version(self):
+        try:
+            with open(os.path.join(self.path, "CURRENT"), 'r') as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def exists(self) -> bool:
+        return self._current_version() is not None
+
+    def load(self):
+        """현재 스냅샷을 읽습니다. 행렬은 읽기 전용 memmap으로 엽니다."""
+        with self._lock:
+            version = self._current_version()
+            if version is None:
+                return False
+            vectors = np.load(os.path.join(self.path, f"vectors-{version}.npy"), mmap_mode="r")
+            with open(os.path.join(self.path, f"meta-{version}.json"), 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            self._set(vectors, meta["ids"], meta["metadatas"], meta["documents"])
+            self._version = version
+            self._journal = []
+            return True
+
+    def save(self):
+        """현재 상태를 새 버전의 스냅샷으로 쓰고 `CURRENT`를 원자적으로 바꿉니다."""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, "LOCK"), 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._write_snapshot()
+
+    def _write_snapshot(self):
+        # 다른 워커가 먼저 저장했다면 그 스냅샷을 읽고 이 워커의 변경만 다시 적용합니다.
+        if self._current_version() not in (None, self._version):
+            journal = self._journal
+            self.load()
+            for op, args in journal:
+                getattr(self, op)(*args)
+        version = f"{time.time_ns()}"
+        alive = np.flatnonzero(self._alive)
+        vectors = np.ascontiguousarray(self._vectors[alive], dtype=np.float32)
+        np.save(os.path.join(self.path, f"vectors-{version}.npy"), vectors)
+        with open(os.path.join(self.path, f"meta-{version}.json"), 'w', encoding='utf-8') as file:
+            json.dump({
+                "ids": [self._ids[row] for row in alive],
+                "metadatas": [self._metadatas[row] for row in alive],
+                "documents": [self._documents[row] for row in alive],
+            }, file, ensure_ascii=False)
+        tmp = os.path.join(self.path, "CURRENT.tmp")
+        with open(tmp, 'w') as file:
+            file.write(version)
+        os.replace(tmp, os.path.join(self.path, "CURRENT"))
+
+        self.load()
+        # 이전 버전 파일은 지웁니다. 이미 memmap으로 열어 둔 워커는 다시 읽을 때까지 그대로 사용할 수 있습니다.
+        for name in os.listdir(self.path):
+            if name.endswith((".npy", ".json")) and version not in name:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    def build(self, collection):
+        """Chroma 컬렉션 전체를 페이지 단위로 읽어 스냅샷을 새로 만듭니다."""
+        ids, metadatas, documents, vectors = [], [], [], []
+        offset = 0
+        while True:
+            page = collection.get(
+                include=["embeddings", "metadatas", "documents"], limit=VECTOR_INDEX_BUILD_BATCH, offset=offset
+            )
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            metadatas.extend(page["metadatas"])
+            documents.extend(page["documents"])
+            vectors.extend(page["embeddings"])
+            offset += len(page["ids"])
+        with self._lock:
+            self._set(_normalize(vectors) if vectors else np.zeros((0, 0), dtype=np.float32), ids, metadatas, documents)
+            self.save()
+        print(f"Vector index built: {len(ids)} books")
+
+    def reconcile(self, collection):
+        """스냅샷과 컬렉션의 책 수가 다르면 (저장 전에 멈춘 워커 등) 빠진 책은 추가하고 없어진 책은 지웁니다."""
+        if collection.count() == len(self):
+            return
+        isbns = []
+        offset = 0
+        while True:
+            page = collection.get(include=[], limit=VECTOR_INDEX_BUILD_BATCH, offset=offset)
+            if not page["ids"]:
+                break
+            isbns.extend(page["ids"])
+            offset += len(page["ids"])
+        with self._lock:
+            current = set(isbns)
+            missing = [isbn for isbn in isbns if isbn not in self.rows]
+            stale = [isbn for isbn in self.rows if isbn not in current]
+            for start in range(0, len(missing), VECTOR_INDEX_BUILD_BATCH):
+                page = collection.get(
+                    ids=missing[start:start + VECTOR_INDEX_BUILD_BATCH], include=["embeddings", "metadatas", "documents"]
+                )
+                self.add(page["ids"], page["embeddings"], page["metadatas"], page["documents"])
+            if stale:
+                self.delete(stale)
+            self.flush()
+        print(f"Vector index reconciled: {len(missing)} added, {len(stale)} removed")
+
+    def _set(self, vectors, ids, metadatas, documents):
+        self._vectors = vectors
+        self._ids = list(ids)
+        self._metadatas = list(metadatas)
+        self._documents = list(documents)
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        self.rows = {isbn: row for row, isbn in enumerate(self._ids)}
+
+    def maybe_reload(self):
+        """다른 워커가 스냅샷을 갱신했다면 다시 읽습니다 (자신의 미저장 변경이 없을 때만)."""
+        now = time.monotonic()
+        if now - self._checked_at < VECTOR_INDEX_RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        with self._lock:
+            if not self._journal and self._current_version() not in (None, self._version):
+                self.load()
+
+    # --- 증분 동기화 ---
+
+    def add(self, isbns, embeddings, metadatas, documents):
+        with self._lock:
+            self._apply_add(isbns, embeddings, metadatas, documents)
+            self._journal.append(("_apply_add", (isbns, embeddings, metadatas, documents)))
+            self._mark_dirty()
+
+    def delete(self, isbns):
+        with self._lock:
+            self._apply_delete(isbns)
+            self._journal.append(("_apply_delete", (isbns,)))
+            self._mark_dirty()
+
+    def _apply_add(self, isbns, embeddings, metadatas, documents):
+        fresh = [index for index, isbn in enumerate(isbns) if isbn not in self.rows]
+        if not fresh:
+            return
+        new_vectors = _normalize([embeddings[index] for index in fresh])
+        if len(self._ids) == 0:
+            vectors = new_vectors
+        else:
+            vectors = np.vstack([self._vectors, new_vectors])
+        alive = np.concatenate([self._alive, np.ones(len(fresh), dtype=bool)])
+        start = len(self._ids)
+        self._vectors = vectors
+        self._alive = alive
+        for offset, index in enumerate(fresh):
+            self._ids.append(isbns[index])
+            self._metadatas.append(metadatas[index])
+            self._documents.append(documents[index])
+            self.rows[isbns[index]] = start + offset
+
+    def _apply_delete(self, isbns):
+        for isbn in isbns:
+            row = self.rows.pop(isbn, None)
+            if row is not None:
+                self._alive[row] = False
+
+    def _mark_dirty(self):
+        if len(self._journal) >= VECTOR_INDEX_FLUSH_EVERY:
+            self.save()
+
+    def flush(self):
+        with self._lock:
+            if self._journal:
+                self.save()
+
+    # --- 조회 ---
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+    def get(self, isbn):
+        """(메타데이터, 설명, 임베딩) 또는 None을 반환합니다."""
+        row = self.rows.get(isbn)
+        if row is None:
+            return None
+        return self._metadatas[row], self._documents[row], self._vectors[row]
+
+    def search(self, query_embeddings, k: int, where=None):
+        """질의 벡터마다 상위 k개의 [(ISBN, 메타데이터, 임베딩, l2 거리), ...]를 반환합니다.
+
+        `where`는 Chroma where 필터와 같은 형식이며, 점수를 계산하기 전에 후보를 거릅니다.
+        """
+        self.maybe_reload()
+        with self._lock:
+            vectors, alive, ids, metadatas = self._vectors, self._alive, self._ids, self._metadatas
+        if len(ids) == 0:
+            return [[] for _ in query_embeddings]
+
+        mask = alive
+        if where:
+            mask = alive & np.fromiter(
+                (_matches(metadata, where) for metadata in metadatas),
+                dtype=bool, count=len(metadatas)
+            )
+        if mask.all():
+            # 삭제/필터가 없으면 memmap 행렬을 복사하지 않고 그대로 곱합니다.
+            candidates, matrix = np.arange(len(ids)), vectors
+        else:
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return [[] for _ in query_embeddings]
+            matrix = vectors[candidates]
+
+        # 정규화된 벡터끼리의 내적(코사인 유사도)으로 한 번에 점수를 계산합니다.
+        scores = _normalize(query_embeddings) @ np.asarray(matrix).T
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_row, columns in enumerate(top):
+            columns = columns[np.argsort(-scores[query_row, columns])]
+            results.append([
+                (ids[candidates[column]], metadatas[candidates[column]], vectors[candidates[column]],
+                 float(2 - 2 * scores[query_row, column]))
+                for column in columns
+            ])
+        return results
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vector_index(collection, path=VECTOR_INDEX_PATH) -> VectorIndex:
+    """경로별로 프로세스에 하나뿐인 인덱스를 반환합니다.
+
+    스냅샷이 없으면 컬렉션에서 새로 만들고, 있으면 컬렉션과 책 수를 비교해 어긋난 부분만 맞춥니다.
+    """
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = VectorIndex(path)
+            if index.load():
+                index.reconcile(collection)
+            else:
+                index.build(collection)
+            _indexes[path] = index
+        return index